@@ -2,6 +2,7 @@
 pragma solidity ^0.8.20;
 
 import "@openzeppelin/contracts/access/AccessControl.sol";
+import "@openzeppelin/contracts/utils/cryptography/MerkleProof.sol";
 
 contract PharmaChain is AccessControl {
     bytes32 public constant MANUFACTURER_ROLE = keccak256("MANUFACTURER_ROLE");
@@ -43,6 +44,7 @@ contract PharmaChain is AccessControl {
 
     event TemperatureRecorded(bytes32 indexed key, string shipmentId, int256 temperature, uint256 timestamp, bytes32 txMerklePlaceHolder);
     event TemperatureBreach(bytes32 indexed key, string shipmentId, int256 temperature, uint256 timestamp);
+    event TemperatureWindow(bytes32 indexed key, bytes32 indexed merkleRoot, uint256 readingCount, int256 minTemp, int256 maxTemp);
 
     event Delivered(bytes32 indexed key, address indexed pharmacy, uint256 atBlock);
 
@@ -151,6 +153,54 @@ contract PharmaChain is AccessControl {
         }
     }
 
+    // Oracle batched temperature: one Merkle root per window of readings.
+    // Leaves are keccak256(keccak256(abi.encode(key, index, timestamp, tempScaled100))),
+    // pairs hashed sorted (OpenZeppelin MerkleProof). Breaches are still recorded one by one.
+    function recordTemperatureBatch(
+        string calldata shipmentId,
+        bytes32 merkleRoot,
+        uint256 readingCount,
+        int256 minTemp,
+        int256 maxTemp,
+        int256[] calldata breachTemps,
+        uint256[] calldata breachTimestamps
+    )
+        external onlyRole(ORACLE_ROLE)
+    {
+        bytes32 k = _key(shipmentId);
+        require(shipments[k].exists, "no shipment");
+        require(readingCount > 0 && minTemp <= maxTemp, "bad window");
+        require(breachTemps.length == breachTimestamps.length, "length mismatch");
+        require(breachTemps.length > 0 || (minTemp >= 200 && maxTemp <= 800), "missing breaches");
+
+        // No TemperatureRecorded here: a window is not one reading, and its max is not a reading value
+        emit TemperatureWindow(k, merkleRoot, readingCount, minTemp, maxTemp);
+
+        for (uint256 i = 0; i < breachTemps.length; i++) {
+            int256 t = breachTemps[i];
+            require((t < 200 || t > 800) && t >= minTemp && t <= maxTemp, "not a breach");
+            shipments[k].breachCount++;
+            emit TemperatureBreach(k, shipmentId, t, breachTimestamps[i]);
+        }
+        if (breachTemps.length > 0) {
+            shipments[k].status = Status.BREACH_DETECTED;
+        }
+    }
+
+    function verifyReading(
+        bytes32 merkleRoot,
+        bytes32[] calldata proof,
+        string calldata shipmentId,
+        uint256 index,
+        uint256 timestamp,
+        int256 tempScaled100
+    )
+        external pure returns (bool)
+    {
+        bytes32 leaf = keccak256(bytes.concat(keccak256(abi.encode(_key(shipmentId), index, timestamp, tempScaled100))));
+        return MerkleProof.verifyCalldata(proof, merkleRoot, leaf);
+    }
+
     // Pharmacy
     function markDelivered(string calldata shipmentId)
         external onlyRole(PHARMACY_ROLE)
@@ -1,7 +1,7 @@
 import { useState, useEffect } from 'react';
 import { BrowserRouter, Routes, Route, NavLink } from "react-router-dom";
 import './App.css';
-import { contract, liveContract, httpProvider, myRoles, getLogsChunked, fetchReadingsFromLogs } from './services/blockchain';
+import { contract, liveContract, httpProvider, myRoles, getLogsChunked, fetchReadingsFromLogs, fetchIndexedShipmentIds } from './services/blockchain';
 import { getSigner } from './services/wallet';
 import RegulatorDashboard from "./components/RegulatorDashboard";
 import ManufacturerDashboard from "./components/ManufacturerDashboard";
@@ -83,19 +83,22 @@ function App() {
       console.log("Starting initial data load...");
       setLoading(true);
       try {
-        const currentBlock = await httpProvider.getBlockNumber();
-        const LOOKBACK = 1000;
-        const startBlock = Math.max(currentBlock - LOOKBACK, 0);
-        const initTopic = contract.interface.getEvent('ShipmentCreated').topicHash;
-
-        const logs = await getLogsChunked({
-          address: contract.target,
-          topics: [initTopic],
-          fromBlock: startBlock,
-          toBlock: currentBlock
-        });
-
-        const shipmentIds = [...new Set(logs.map(l => String(contract.interface.parseLog(l).args[1])))].filter(id => id);
+        let shipmentIds = await fetchIndexedShipmentIds();
+        if (!shipmentIds) {
+          const currentBlock = await httpProvider.getBlockNumber();
+          const LOOKBACK = 1000;
+          const startBlock = Math.max(currentBlock - LOOKBACK, 0);
+          const initTopic = contract.interface.getEvent('ShipmentCreated').topicHash;
+
+          const logs = await getLogsChunked({
+            address: contract.target,
+            topics: [initTopic],
+            fromBlock: startBlock,
+            toBlock: currentBlock
+          });
+
+          shipmentIds = [...new Set(logs.map(l => String(contract.interface.parseLog(l).args[1])))].filter(id => id);
+        }
         console.log("Found unique shipment IDs:", shipmentIds);
 
         for (const id of shipmentIds) {
@@ -5,6 +5,8 @@ import { getSigner } from './wallet';
 const HTTP_URL = process.env.REACT_APP_ALCHEMY_URL;
 const WS_URL = process.env.REACT_APP_ALCHEMY_WS_URL || "";
 const CONTRACT_ADDRESS = process.env.REACT_APP_CONTRACT_ADDRESS;
+// Optional local event indexer (indexer/app.py). When set, history comes from it instead of log scans.
+const INDEXER_URL = process.env.REACT_APP_INDEXER_URL || "";
 
 const providerOptions = {
   batchMaxCount: 1,
@@ -87,7 +89,30 @@ export async function getLogsChunked({ address, topics, fromBlock, toBlock }) {
 
 const keyFor = (id) => ethers.keccak256(ethers.toUtf8Bytes(id));
 
+// Returns the parsed JSON, or null if no indexer is configured or it is unreachable
+async function fetchFromIndexer(path) {
+  if (!INDEXER_URL) return null;
+  try {
+    const res = await fetch(`${INDEXER_URL}${path}`);
+    if (!res.ok) throw new Error(`HTTP ${res.status}`);
+    return await res.json();
+  } catch (e) {
+    console.warn(`Indexer request ${path} failed, falling back to log scan`, e);
+    return null;
+  }
+}
+
+export async function fetchIndexedShipmentIds() {
+  const shipments = await fetchFromIndexer('/shipments');
+  return shipments ? shipments.map(s => s.shipmentId).filter(id => id) : null;
+}
+
 export async function fetchReadingsFromLogs(shipmentId) {
+  const indexed = await fetchFromIndexer(`/shipments/${encodeURIComponent(shipmentId)}/readings`);
+  if (indexed) {
+    return indexed.map(r => ({ ...r, timestamp: r.timestamp * 1000 }));
+  }
+
   try {
     const currentBlock = await httpProvider.getBlockNumber();
     const LOOKBACK = 5000;
@@ -118,7 +143,21 @@ export async function fetchReadingsFromLogs(shipmentId) {
   }
 }
 
+const LIFECYCLE_TYPES = { ShipmentCreated: "CREATED", CustodyTransferred: "TRANSFERRED", Delivered: "DELIVERED" };
+
 export async function fetchLifecycleEvents(shipmentId) {
+  const indexed = await fetchFromIndexer(
+    `/shipments/${encodeURIComponent(shipmentId)}/timeline?event=${Object.keys(LIFECYCLE_TYPES).join(',')}`
+  );
+  if (indexed) {
+    return indexed.map(e => ({
+      type: LIFECYCLE_TYPES[e.event],
+      timestamp: e.timestamp * 1000,
+      txHash: e.txHash,
+      blockNumber: e.blockNumber,
+    }));
+  }
+
   try {
     const key = ethers.keccak256(ethers.toUtf8Bytes(shipmentId));
     const currentBlock = await httpProvider.getBlockNumber();
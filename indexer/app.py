@@ -0,0 +1,295 @@
+# indexer/app.py
+# Incremental event indexer for the PharmaChain contract.
+#
+# Reads every PharmaChain event into a local SQLite database, keeps a
+# checkpoint so restarts resume where they stopped, and serves per-shipment
+# timelines through a small HTTP/JSON API so the explorer no longer has to
+# rescan thousands of blocks on every page load.
+import json
+import os
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+import yaml
+from dotenv import load_dotenv
+from eth_utils import event_abi_to_log_topic
+from web3 import Web3
+from web3.middleware import ExtraDataToPOAMiddleware
+
+from store import EventStore
+
+# --- 1. SETUP AND CONFIGURATION ---
+script_dir = os.path.dirname(os.path.abspath(__file__))
+abi_path = os.path.join(script_dir, '..', 'explorer', 'src', 'abis', 'PharmaChain.json')
+config_path = os.path.join(script_dir, 'config.yaml')
+
+
+def load_settings():
+    load_dotenv(dotenv_path=os.path.join(script_dir, '..', '.env'))
+    alchemy_url = os.getenv("ALCHEMY_URL")
+    contract_address = os.getenv("CONTRACT_ADDRESS")
+    if not all([alchemy_url, contract_address]):
+        raise Exception("Please set ALCHEMY_URL and CONTRACT_ADDRESS in the root .env file.")
+
+    with open(config_path, 'r', encoding='utf-8') as f:
+        config = yaml.safe_load(f)['indexer']
+    # The deployment block can also come from the environment, e.g. in Docker
+    if os.getenv("INDEXER_START_BLOCK"):
+        config['start_block'] = int(os.getenv("INDEXER_START_BLOCK"))
+
+    try:
+        with open(abi_path, 'r', encoding='utf-8') as f:
+            abi_data = json.load(f)
+    except FileNotFoundError:
+        raise Exception(f"ABI file not found at {abi_path}.")
+    contract_abi = abi_data if isinstance(abi_data, list) else abi_data.get('abi')
+    return alchemy_url, contract_address, contract_abi, config
+
+
+def shipment_key(shipment_id):
+    return Web3.to_hex(Web3.keccak(text=shipment_id))
+
+
+def _json_safe(value):
+    if isinstance(value, (bytes, bytearray)):
+        return Web3.to_hex(value)
+    if isinstance(value, (list, tuple)):
+        return [_json_safe(v) for v in value]
+    return value
+
+
+# --- 2. CHUNK SIZING ---
+class ChunkSizer:
+    """Adapts the eth_getLogs block range to whatever the provider accepts.
+
+    Shrinks on range/size errors (using the provider's own suggestion when the
+    error message carries one) and grows back after successful chunks, but
+    never past the provider's limit or the last size that worked once a
+    range error has been seen. Rate limits are not range errors: a smaller
+    range would not help, so they leave the size alone.
+    """
+
+    RANGE_ERRORS = ("block range", "range too large", "range is too", "response size", "query returned more than",
+                    "too many blocks", "too many logs", "logs limit", "is limited to")
+    RATE_LIMIT_ERRORS = ("429", "too many requests", "rate limit", "capacity", "throughput")
+
+    def __init__(self, initial, maximum):
+        self.size = initial
+        self.maximum = maximum
+        self.last_ok = None
+
+    def grow(self):
+        """Call after a chunk of the current size succeeded."""
+        self.last_ok = self.size
+        self.size = min(self.maximum, self.size * 2)
+
+    def shrink(self, error):
+        """Return True if the error was a range error and the chunk got smaller."""
+        text = str(error).lower()
+        if any(marker in text for marker in self.RATE_LIMIT_ERRORS):
+            return False
+        if not any(marker in text for marker in self.RANGE_ERRORS):
+            return False
+        suggested = self.suggested_size(text)
+        new_size = suggested if suggested and suggested < self.size else self.size // 2
+        if new_size < 1 or new_size == self.size:
+            return False
+        self.size = new_size
+        # A suggested size is the provider's hard limit; otherwise stay at or below what last worked
+        ceiling = suggested if suggested else max(self.last_ok or 0, new_size)
+        self.maximum = min(self.maximum, ceiling)
+        return True
+
+    @staticmethod
+    def suggested_size(text):
+        # Infura-style: "Try with this block range [0x1, 0x2]"
+        hexes = re.findall(r"\[(0x[0-9a-f]+),\s*(0x[0-9a-f]+)\]", text)
+        if hexes:
+            start, end = (int(h, 16) for h in hexes[0])
+            return max(1, end - start + 1)
+        # Alchemy-style: "up to a 10 block range"
+        match = re.search(r"(\d+)\s*block range", text)
+        return int(match.group(1)) if match else None
+
+
+# --- 3. INDEXER ---
+class Indexer:
+    def __init__(self, w3, contract, store, config):
+        self.w3 = w3
+        self.contract = contract
+        self.store = store
+        self.start_block = config.get('start_block', 0)
+        self.confirmations = config.get('confirmations', 12)
+        self.poll_seconds = config.get('poll_seconds', 12)
+        self.retry_seconds = config.get('retry_seconds', 1)
+        self.max_retries = config.get('max_retries', 5)
+        self.sizer = ChunkSizer(config.get('initial_chunk_size', 2000), config.get('max_chunk_size', 10000))
+        self.head = None
+
+        # topic0 -> event class, for every event in the ABI
+        self.events_by_topic = {
+            Web3.to_hex(event_abi_to_log_topic(abi)): getattr(contract.events, abi['name'])
+            for abi in contract.abi if abi.get('type') == 'event'
+        }
+
+    def decode(self, logs):
+        block_times = {}
+        events = []
+        for log in logs:
+            if log.get('removed'):
+                continue
+            event_cls = self.events_by_topic.get(Web3.to_hex(log['topics'][0])) if log['topics'] else None
+            if event_cls is None:
+                continue
+            decoded = event_cls().process_log(log)
+            args = {name: _json_safe(value) for name, value in decoded['args'].items()}
+
+            timestamp = args.get('timestamp')
+            if timestamp is None:
+                number = log['blockNumber']
+                if number not in block_times:
+                    block_times[number] = self.w3.eth.get_block(number)['timestamp']
+                timestamp = block_times[number]
+
+            events.append({
+                'block_number': log['blockNumber'],
+                'block_hash': Web3.to_hex(log['blockHash']),
+                'tx_hash': Web3.to_hex(log['transactionHash']),
+                'log_index': log['logIndex'],
+                'event': decoded['event'],
+                'shipment_key': args.get('key'),
+                'shipment_id': args.get('shipmentId'),
+                'temperature': args.get('temperature'),
+                'timestamp': timestamp,
+                'args': args,
+            })
+        return events
+
+    def check_reorg(self):
+        """Roll back past the confirmation depth if the checkpoint block is no longer canonical."""
+        checkpoint, checkpoint_hash = self.store.get_checkpoint()
+        if checkpoint is None or checkpoint_hash is None:
+            return
+        chain_hash = Web3.to_hex(self.w3.eth.get_block(checkpoint)['hash'])
+        if chain_hash != checkpoint_hash:
+            target = max(self.start_block - 1, checkpoint - self.confirmations)
+            deleted = self.store.rollback_to(target)
+            print(f"⚠️  Reorg detected at block {checkpoint}. Rolled back to {target} ({deleted} events removed).")
+
+    def sync_once(self):
+        self.head = self.w3.eth.block_number
+        self.check_reorg()
+
+        checkpoint, _ = self.store.get_checkpoint()
+        start = self.start_block if checkpoint is None else checkpoint + 1
+        retries = 0
+        while start <= self.head:
+            end = min(start + self.sizer.size - 1, self.head)
+            try:
+                logs = self.w3.eth.get_logs({
+                    'address': self.contract.address,
+                    'fromBlock': start,
+                    'toBlock': end,
+                })
+            except Exception as e:
+                if self.sizer.shrink(e):
+                    print(f"getLogs rejected {start}-{end}, reducing chunk size to {self.sizer.size}...")
+                    continue
+                if retries >= self.max_retries:
+                    raise
+                # Rate limit or transport error: same range again after an exponential backoff
+                delay = self.retry_seconds * 2 ** retries
+                retries += 1
+                print(f"getLogs failed for {start}-{end}, retrying in {delay}s: {e}")
+                time.sleep(delay)
+                continue
+            retries = 0
+
+            events = self.decode(logs)
+            # Only blocks inside the confirmation window can still be reorged, so only they need a hash
+            end_hash = Web3.to_hex(self.w3.eth.get_block(end)['hash']) if end > self.head - self.confirmations else None
+            self.store.save_chunk(events, end, end_hash)
+            if events:
+                print(f"Indexed blocks {start}-{end}: {len(events)} events.")
+            start = end + 1
+            self.sizer.grow()
+
+    def run(self):
+        while True:
+            try:
+                self.sync_once()
+            except Exception as e:
+                print(f"❌ Indexing error, retrying in {self.poll_seconds}s: {e}")
+            time.sleep(self.poll_seconds)
+
+
+# --- 4. HTTP API ---
+def make_handler(store, indexer):
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, status, body):
+            payload = json.dumps(body).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.send_header('Access-Control-Allow-Origin', '*')
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            parts = [unquote(p) for p in url.path.strip('/').split('/') if p]
+            query = parse_qs(url.query)
+
+            if parts == ['status']:
+                checkpoint, _ = store.get_checkpoint()
+                return self._send(200, {'checkpoint': checkpoint, 'head': indexer.head, 'events': store.count()})
+            if parts == ['shipments']:
+                return self._send(200, store.shipments())
+            if len(parts) == 3 and parts[0] == 'shipments' and parts[2] == 'timeline':
+                events = query['event'][0].split(',') if 'event' in query else None
+                return self._send(200, store.timeline(shipment_key(parts[1]), events))
+            if len(parts) == 3 and parts[0] == 'shipments' and parts[2] == 'readings':
+                readings = store.timeline(shipment_key(parts[1]), ['TemperatureRecorded'])
+                return self._send(200, [{
+                    'temperature': r['temperature'],
+                    'timestamp': r['timestamp'],
+                    'txHash': r['txHash'],
+                    'blockNumber': r['blockNumber'],
+                } for r in readings])
+            return self._send(404, {'error': 'not found'})
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def main():
+    alchemy_url, contract_address, contract_abi, config = load_settings()
+
+    w3 = Web3(Web3.HTTPProvider(alchemy_url))
+    w3.middleware_onion.inject(ExtraDataToPOAMiddleware, layer=0)
+    if not w3.is_connected():
+        raise ConnectionError("🛑 Error: Could not connect to Ethereum node.")
+
+    contract = w3.eth.contract(address=contract_address, abi=contract_abi)
+    db_path = config.get('database', 'pharmachain_events.db')
+    if not os.path.isabs(db_path):
+        db_path = os.path.join(script_dir, db_path)
+    store = EventStore(db_path)
+    indexer = Indexer(w3, contract, store, config)
+
+    host, port = config.get('api_host', '127.0.0.1'), config.get('api_port', 8600)
+    server = ThreadingHTTPServer((host, port), make_handler(store, indexer))
+    threading.Thread(target=server.serve_forever, name="indexer-api", daemon=True).start()
+    print(f"Serving shipment timelines on http://{host}:{port}")
+
+    indexer.run()
+
+
+if __name__ == "__main__":
+    print("✅ PharmaChain event indexer started.")
+    main()
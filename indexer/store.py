@@ -0,0 +1,123 @@
+# indexer/store.py
+# SQLite storage for indexed PharmaChain events.
+#
+# The database runs in WAL mode so the HTTP API can read while the indexer
+# writes. Each thread opens its own connection through EventStore.connect().
+import json
+import sqlite3
+import threading
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    block_number INTEGER NOT NULL,
+    block_hash   TEXT    NOT NULL,
+    tx_hash      TEXT    NOT NULL,
+    log_index    INTEGER NOT NULL,
+    event        TEXT    NOT NULL,
+    shipment_key TEXT,
+    shipment_id  TEXT,
+    temperature  INTEGER,
+    timestamp    INTEGER,
+    args         TEXT    NOT NULL,
+    PRIMARY KEY (tx_hash, log_index)
+);
+CREATE INDEX IF NOT EXISTS idx_events_shipment ON events (shipment_key, block_number, log_index);
+CREATE INDEX IF NOT EXISTS idx_events_block ON events (block_number);
+CREATE INDEX IF NOT EXISTS idx_events_name ON events (event, block_number);
+
+CREATE TABLE IF NOT EXISTS checkpoint (
+    id           INTEGER PRIMARY KEY CHECK (id = 1),
+    block_number INTEGER NOT NULL,
+    block_hash   TEXT
+);
+"""
+
+
+class EventStore:
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        conn = self.connect()
+        conn.executescript(SCHEMA)
+        conn.commit()
+
+    def connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    # --- Checkpoint ---
+    def get_checkpoint(self):
+        row = self.connect().execute("SELECT block_number, block_hash FROM checkpoint WHERE id = 1").fetchone()
+        return (row['block_number'], row['block_hash']) if row else (None, None)
+
+    def save_chunk(self, events, block_number, block_hash):
+        """Insert a chunk of events and advance the checkpoint in one transaction."""
+        conn = self.connect()
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO events (block_number, block_hash, tx_hash, log_index, event, "
+                "shipment_key, shipment_id, temperature, timestamp, args) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(
+                    e['block_number'], e['block_hash'], e['tx_hash'], e['log_index'], e['event'],
+                    e['shipment_key'], e['shipment_id'], e['temperature'], e['timestamp'], json.dumps(e['args']),
+                ) for e in events],
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO checkpoint (id, block_number, block_hash) VALUES (1, ?, ?)",
+                (block_number, block_hash),
+            )
+
+    def rollback_to(self, block_number):
+        """Forget everything above `block_number` after a reorg."""
+        conn = self.connect()
+        with conn:
+            deleted = conn.execute("DELETE FROM events WHERE block_number > ?", (block_number,)).rowcount
+            conn.execute(
+                "INSERT OR REPLACE INTO checkpoint (id, block_number, block_hash) VALUES (1, ?, NULL)",
+                (block_number,),
+            )
+        return deleted
+
+    # --- Queries ---
+    @staticmethod
+    def _row_to_event(row):
+        return {
+            'event': row['event'],
+            'blockNumber': row['block_number'],
+            'txHash': row['tx_hash'],
+            'logIndex': row['log_index'],
+            'timestamp': row['timestamp'],
+            'shipmentId': row['shipment_id'],
+            'temperature': row['temperature'],
+            'args': json.loads(row['args']),
+        }
+
+    def timeline(self, shipment_key, events=None):
+        sql = "SELECT * FROM events WHERE shipment_key = ?"
+        params = [shipment_key]
+        if events:
+            sql += f" AND event IN ({', '.join('?' for _ in events)})"
+            params += list(events)
+        sql += " ORDER BY block_number, log_index"
+        return [self._row_to_event(r) for r in self.connect().execute(sql, params)]
+
+    def shipments(self):
+        rows = self.connect().execute(
+            "SELECT shipment_id, shipment_key, block_number, args FROM events "
+            "WHERE event = 'ShipmentCreated' ORDER BY block_number, log_index"
+        )
+        return [{
+            'shipmentId': r['shipment_id'],
+            'key': r['shipment_key'],
+            'blockNumber': r['block_number'],
+            **{k: v for k, v in json.loads(r['args']).items() if k in ('manufacturer', 'recipient')},
+        } for r in rows]
+
+    def count(self):
+        return self.connect().execute("SELECT COUNT(*) FROM events").fetchone()[0]
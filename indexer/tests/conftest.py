@@ -0,0 +1,6 @@
+# indexer/tests/conftest.py
+# The indexer modules import each other as top-level modules, as when run from indexer/.
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
@@ -0,0 +1,116 @@
+# indexer/tests/test_indexer.py
+# ChunkSizer and reorg handling against a fake node with a getLogs range limit.
+#
+#   python -m pytest indexer/tests
+import importlib.util
+import os
+from types import SimpleNamespace
+
+from web3 import Web3
+
+from store import EventStore
+
+# Loaded under its own name so it never shadows simulator/app.py in a combined pytest run
+_spec = importlib.util.spec_from_file_location(
+    "indexer_app", os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app.py'))
+indexer_app = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(indexer_app)
+ChunkSizer, Indexer = indexer_app.ChunkSizer, indexer_app.Indexer
+
+CONTRACT = SimpleNamespace(address="0x" + "22" * 20, abi=[], events=None)
+
+
+class FakeEth:
+    """A chain of `head` blocks whose getLogs rejects ranges wider than `limit`.
+
+    `faults` are raised one per getLogs call before the range is checked.
+    `message` is the range error, with {limit} filled in.
+    """
+
+    def __init__(self, head, limit, message="Log response size exceeded. You can make eth_getLogs requests "
+                                            "with up to a {limit} block range", faults=()):
+        self.block_number = head
+        self.limit = limit
+        self.message = message
+        self.faults = list(faults)
+        self.fork = 0
+        self.ok = []
+        self.failed = 0
+
+    def get_block(self, number):
+        return {'hash': Web3.keccak(text=f"{self.fork}:{number}"), 'timestamp': number}
+
+    def get_logs(self, params):
+        if self.faults:
+            self.failed += 1
+            raise ValueError(self.faults.pop(0))
+        if params['toBlock'] - params['fromBlock'] + 1 > self.limit:
+            self.failed += 1
+            raise ValueError(self.message.format(limit=self.limit))
+        self.ok.append((params['fromBlock'], params['toBlock']))
+        return []
+
+
+def make_indexer(tmp_path, eth, **config):
+    config = {'start_block': 1, 'confirmations': 12, 'initial_chunk_size': 2000, 'max_chunk_size': 10000,
+              'retry_seconds': 0, **config}
+    return Indexer(SimpleNamespace(eth=eth), CONTRACT, EventStore(str(tmp_path / "events.db")), config)
+
+
+def test_suggested_range_is_used_once_and_never_exceeded(tmp_path):
+    eth = FakeEth(head=10000, limit=10)
+    indexer = make_indexer(tmp_path, eth)
+    indexer.sync_once()
+    assert (len(eth.ok), eth.failed) == (1000, 1)
+    assert eth.ok[0] == (1, 10) and eth.ok[-1] == (9991, 10000)
+    assert indexer.store.get_checkpoint()[0] == 10000
+
+
+def test_halving_without_a_suggestion_settles_below_the_limit(tmp_path):
+    eth = FakeEth(head=10000, limit=300, message="query returned more than 10000 results")
+    indexer = make_indexer(tmp_path, eth)
+    indexer.sync_once()
+    # 2000 -> 1000 -> 500 -> 250, then it never tries a range that already failed
+    assert eth.failed == 3
+    assert indexer.sizer.maximum == 250
+    assert all(end - start + 1 <= 250 for start, end in eth.ok)
+
+
+def test_rate_limits_back_off_without_shrinking_the_range(tmp_path):
+    eth = FakeEth(head=4000, limit=10000, faults=["429 Client Error: Too Many Requests for url"] * 3)
+    indexer = make_indexer(tmp_path, eth)
+    indexer.sync_once()
+    assert eth.failed == 3
+    assert eth.ok == [(1, 2000), (2001, 4000)]
+    assert indexer.sizer.maximum == 10000
+
+
+def test_rate_limit_messages_are_not_range_errors():
+    sizer = ChunkSizer(2000, 10000)
+    for message in ("429 Client Error: Too Many Requests", "Your app has exceeded its compute units per second capacity",
+                    "daily request limit exceeded"):
+        assert not sizer.shrink(ValueError(message))
+    assert (sizer.size, sizer.maximum) == (2000, 10000)
+
+
+def test_reorg_at_the_checkpoint_rolls_back_past_the_confirmation_depth(tmp_path):
+    eth = FakeEth(head=100, limit=10000)
+    indexer = make_indexer(tmp_path, eth)
+    indexer.sync_once()
+    event = {'block_hash': "0x00", 'log_index': 0, 'event': 'TemperatureRecorded', 'shipment_key': "0x01",
+             'shipment_id': None, 'temperature': 500, 'timestamp': 0, 'args': {}}
+    indexer.store.save_chunk([dict(event, block_number=80, tx_hash="0xa"), dict(event, block_number=95, tx_hash="0xb")],
+                             100, Web3.to_hex(eth.get_block(100)['hash']))
+
+    indexer.check_reorg()
+    assert indexer.store.count() == 2
+
+    eth.fork = 1
+    indexer.check_reorg()
+    assert indexer.store.get_checkpoint() == (88, None)
+    assert indexer.store.count() == 1
+
+    # The next sync re-reads the rolled back blocks and records the new canonical hash
+    indexer.sync_once()
+    assert eth.ok[-1] == (89, 100)
+    assert indexer.store.get_checkpoint() == (100, Web3.to_hex(eth.get_block(100)['hash']))
@@ -1,129 +1,527 @@
 import os
+import queue
 import time
 import json
-import random
 import yaml
 from dotenv import load_dotenv
 from web3 import Web3
 from web3.middleware import ExtraDataToPOAMiddleware
-from web3.exceptions import ContractLogicError # Import for preflight check
+from web3.exceptions import ContractLogicError, TimeExhausted # Import for preflight check
+from fast_tx import LeanSigner, RecordTemperatureTemplate
+from merkle import MerkleTree, leaf_hash, shipment_key
+from metrics import Metrics, install_profiler_hooks
+from outbox import Outbox, OutboxSender
+from proof_store import ProofStore
+from rpc import CountingHTTPProvider, FeeCache, RpcBatch, RpcStats, quantity
+from sensor import generate_temperature_reading
+from tx_pipeline import NonceManager, ReceiptTracker, find_receipt
 
 # --- 1. SETUP AND CONFIGURATION ---
-print("✅ IoT Simulator for PharmaChain contract started.")
-
-# ... (This entire setup section is correct from our last version)
+# Nothing here touches the network or the environment, so this module can be
+# imported as a library. Simulator.from_env() does the validation and connecting.
 script_dir = os.path.dirname(os.path.abspath(__file__))
 dotenv_path = os.path.join(script_dir, '..', '.env')
-load_dotenv(dotenv_path=dotenv_path)
+abi_path = os.path.join(script_dir, '..', 'explorer', 'src', 'abis', 'PharmaChain.json')
+config_path = os.path.join(script_dir, 'config.yaml')
 
-ALCHEMY_URL = os.getenv("ALCHEMY_URL")
-PRIVATE_KEY = os.getenv("SIMULATOR_PRIVATE_KEY")
-CONTRACT_ADDRESS = os.getenv("CONTRACT_ADDRESS")
-SHIPMENT_ID = os.getenv("SHIPMENT_ID", "SHIP-001")
+def load_config(path=config_path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return yaml.safe_load(f)
 
-if not all([ALCHEMY_URL, PRIVATE_KEY, CONTRACT_ADDRESS]):
-    raise Exception("Please set ALCHEMY_URL, SIMULATOR_PRIVATE_KEY, and CONTRACT_ADDRESS in the root .env file.")
+def load_abi(path=abi_path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            abi_data = json.load(f)
+            contract_abi = abi_data if isinstance(abi_data, list) else abi_data.get('abi')
+    except FileNotFoundError:
+        raise Exception(f"ABI file not found at {path}.")
 
-abi_path = os.path.join(script_dir, '..', 'explorer', 'src', 'abis', 'PharmaChain.json')
-config_path = os.path.join(script_dir, 'config.yaml')
+    if not contract_abi:
+        raise Exception(f"Could not find ABI array in {path}.")
+    return contract_abi
 
-with open(config_path, 'r', encoding='utf-8') as f:
-    config = yaml.safe_load(f)
-sim_config = config['simulation']
+# --- 2. SIMULATOR ---
+class Simulator:
+    """The oracle for one shipment: preflight, sign and submit its temperature readings."""
 
-try:
-    with open(abi_path, 'r', encoding='utf-8') as f:
-        abi_data = json.load(f)
-        CONTRACT_ABI = abi_data if isinstance(abi_data, list) else abi_data.get('abi')
-except FileNotFoundError:
-    raise Exception(f"ABI file not found at {abi_path}.")
+    def __init__(self, w3, contract_address, private_key, config, shipment_id, abi=None, metrics=None):
+        self.w3 = w3
+        self.config = config
+        self.sim_config = config['simulation']
+        self.rpc_config = config.get('rpc') or {}
+        self.shipment_id = shipment_id
 
-if not CONTRACT_ABI:
-    raise Exception(f"Could not find ABI array in {abi_path}.")
+        # --- 3. LOAD WALLET AND CONTRACT ---
+        self.signer = LeanSigner(private_key)
+        self.wallet_address = self.signer.address
+        self.pharma_contract = w3.eth.contract(address=contract_address, abi=abi or load_abi())
+        # The calldata only differs in the temperature word, so it is encoded once per shipment
+        self.template = RecordTemperatureTemplate(self.pharma_contract, shipment_id)
+        self._templates = {shipment_id: self.template}
 
-# --- 2. CONNECT TO ETHEREUM NETWORK ---
-w3 = Web3(Web3.HTTPProvider(ALCHEMY_URL))
-w3.middleware_onion.inject(ExtraDataToPOAMiddleware, layer=0) 
+        self.rpc_stats = getattr(w3.provider, 'stats', None) or RpcStats()
+        self.fee_cache = FeeCache(
+            gas_price_ttl=self.rpc_config.get('gas_price_ttl_seconds', 15),
+            fee_history_ttl=self.rpc_config.get('fee_history_ttl_seconds', 15),
+            eip1559=self.rpc_config.get('eip1559', False),
+            priority_percentile=self.rpc_config.get('priority_fee_percentile', 50),
+        )
+        self._chain_id = None
 
-if not w3.is_connected():
-    raise ConnectionError("🛑 Error: Could not connect to Ethereum node.")
+        self.metrics = metrics or Metrics(enabled=False)
+        self.metrics.gauge('rpc_requests_total', lambda: self.rpc_stats.requests, kind='counter')
+        self.metrics.gauge('rpc_calls_total', lambda: self.rpc_stats.calls, kind='counter')
 
-print(f"Connected to Ethereum chain ID: {w3.eth.chain_id}")
+    @classmethod
+    def from_env(cls, config=None):
+        load_dotenv(dotenv_path=dotenv_path)
+        alchemy_url = os.getenv("ALCHEMY_URL")
+        private_key = os.getenv("SIMULATOR_PRIVATE_KEY")
+        contract_address = os.getenv("CONTRACT_ADDRESS")
+        shipment_id = os.getenv("SHIPMENT_ID", "SHIP-001")
 
-# --- 3. LOAD WALLET AND CONTRACT ---
-account = w3.eth.account.from_key(PRIVATE_KEY)
-wallet_address = account.address
-print(f"Loaded simulator wallet: {wallet_address}")
+        if not all([alchemy_url, private_key, contract_address]):
+            raise Exception("Please set ALCHEMY_URL, SIMULATOR_PRIVATE_KEY, and CONTRACT_ADDRESS in the root .env file.")
 
-pharma_contract = w3.eth.contract(address=CONTRACT_ADDRESS, abi=CONTRACT_ABI)
+        w3 = Web3(CountingHTTPProvider(alchemy_url, stats=RpcStats()))
+        w3.middleware_onion.inject(ExtraDataToPOAMiddleware, layer=0)
 
-# --- 4. SIMULATOR LOGIC ---
-def generate_temperature_reading(config):
-    # ... (this function is correct)
-    temp = random.normalvariate(config['normal_temp'], config['temp_std_dev'])
-    if random.random() < config['breach_chance']:
-        temp += random.uniform(5, 10)
-    return temp
+        if not w3.is_connected():
+            raise ConnectionError("🛑 Error: Could not connect to Ethereum node.")
 
-def main():
-    print(f"Starting temperature simulation for Shipment ID: {SHIPMENT_ID}")
-    while True:
+        config = config or load_config()
+        metrics_config = config.get('metrics') or {}
+        metrics = Metrics(enabled=metrics_config.get('enabled', False), trace_path=metrics_config.get('trace_file'))
+        if metrics.enabled:
+            # The address can also come from the environment, e.g. METRICS_HOST=0.0.0.0 in Docker
+            host = os.getenv("METRICS_HOST") or metrics_config.get('host', '127.0.0.1')
+            port = int(os.getenv("METRICS_PORT") or metrics_config.get('port', 9108))
+            try:
+                metrics.serve(host, port)
+                print(f"Serving metrics on http://{host}:{port}/metrics")
+            except OSError as e:
+                # e.g. a second simulator on the same host: keep running, just without the endpoint
+                print(f"⚠️  Could not serve metrics on {host}:{port}, continuing without /metrics: {e}")
+            profile_dir = metrics_config.get('profile_dir', 'profiles')
+            if not os.path.isabs(profile_dir):
+                profile_dir = os.path.join(script_dir, profile_dir)
+            if install_profiler_hooks(profile_dir):
+                print(f"Profiler hooks installed (kill -USR1 / -USR2 {os.getpid()}), output in {profile_dir}")
+
+        simulator = cls(w3, contract_address, private_key, config, shipment_id, metrics=metrics)
+        print(f"Connected to Ethereum chain ID: {simulator.chain_id}")
+        print(f"Loaded simulator wallet: {simulator.wallet_address}")
+        return simulator
+
+    @property
+    def chain_id(self):
+        # The chain ID never changes, so it is read once for the process lifetime
+        if self._chain_id is None:
+            self._chain_id = self.w3.eth.chain_id
+        return self._chain_id
+
+    # --- 4. SIMULATOR LOGIC ---
+    def record_reading(self, temp_scaled):
+        self.metrics.inc('readings_total')
+        if temp_scaled < 200 or temp_scaled > 800:
+            self.metrics.inc('breaches_total')
+
+    def prepare_reading(self, temp_scaled, with_nonce=True):
+        """Preflight a reading and fetch everything its transaction needs in one JSON-RPC batch.
+
+        Returns the unsigned transaction dict. Raises ContractLogicError if the
+        preflight eth_call reverts.
+        """
+        return self.prepare_transaction(self.template.calldata(temp_scaled), with_nonce)
+
+    def prepare_transaction(self, calldata, with_nonce=True, gas=200000):
+        batch = RpcBatch(self.w3.provider, enabled=self.rpc_config.get('batch_requests', True))
+        preflight = self._add_preflight(batch, calldata)
+        nonce_call = batch.add('eth_getTransactionCount', [self.wallet_address, 'pending']) if with_nonce else None
+        self.fee_cache.add_to(batch)
+        # Preflight, nonce and fee lookups share one round-trip when batched, so they are one stage
+        with self.metrics.stage('preflight', calls=len(batch.calls)):
+            batch.execute()
+
+        error = self._preflight_error(preflight)
+        if error is not None:
+            raise error
+
+        tx_data = self._transaction(calldata, gas, self.fee_cache.resolve())
+        if nonce_call is not None:
+            tx_data['nonce'] = quantity(nonce_call.value())
+        return tx_data
+
+    def prepare_readings(self, readings):
+        """Preflight many (shipment_id, temp_scaled) readings in one JSON-RPC batch, for draining a backlog.
+
+        Returns one entry per reading: the unsigned transaction dict (without
+        nonce), or the ContractLogicError its preflight reverted with. Any other
+        RPC error is raised for the whole batch.
+        """
+        batch = RpcBatch(self.w3.provider, enabled=self.rpc_config.get('batch_requests', True))
+        calldatas = [self.template_for(shipment_id).calldata(temp_scaled) for shipment_id, temp_scaled in readings]
+        preflights = [self._add_preflight(batch, calldata) for calldata in calldatas]
+        self.fee_cache.add_to(batch)
+        with self.metrics.stage('preflight', calls=len(batch.calls)):
+            batch.execute()
+
+        errors = [self._preflight_error(call) for call in preflights]
+        fees = self.fee_cache.resolve()
+        return [error if error is not None else self._transaction(calldata, 200000, fees)
+                for calldata, error in zip(calldatas, errors)]
+
+    def template_for(self, shipment_id):
+        template = self._templates.get(shipment_id)
+        if template is None:
+            template = self._templates[shipment_id] = RecordTemperatureTemplate(self.pharma_contract, shipment_id)
+        return template
+
+    def _add_preflight(self, batch, calldata):
+        return batch.add('eth_call', [
+            {'from': self.wallet_address, 'to': self.pharma_contract.address, 'data': Web3.to_hex(calldata)}, 'latest'
+        ])
+
+    def _preflight_error(self, call):
+        """The ContractLogicError for a reverted preflight call, or None. Other RPC errors are raised."""
+        if call.error is None:
+            return None
+        if call.error.code == 3 or 'revert' in str(call.error).lower():
+            self.metrics.inc('preflight_failures_total')
+            return ContractLogicError(str(call.error))
+        raise call.error
+
+    def _transaction(self, calldata, gas, fees):
+        return {
+            'to': self.pharma_contract.address,
+            'data': calldata,
+            'value': 0,
+            'chainId': self.chain_id,
+            'gas': gas,
+            **fees,
+        }
+
+    def sign_and_send(self, tx_data):
+        with self.metrics.stage('sign'):
+            signed_tx = self.signer.sign_transaction(tx_data)
+        with self.metrics.stage('send'):
+            return self.w3.eth.send_raw_transaction(signed_tx.raw_transaction)
+
+    def wait_for_receipt(self, tx_hash):
         try:
-            temperature = generate_temperature_reading(sim_config)
-            temp_scaled = int(temperature * 100)
-            print(f"\n[{time.ctime()}] 🌡️  Generated reading: {temperature:.2f}°C (Scaled: {temp_scaled})")
+            with self.metrics.stage('receipt'):
+                tx_receipt = self.w3.eth.wait_for_transaction_receipt(
+                    tx_hash, timeout=180, poll_latency=self.rpc_config.get('receipt_poll_seconds', 2)
+                )
+        except TimeExhausted:
+            self.metrics.inc('receipt_timeouts_total')
+            raise
+        if tx_receipt.status != 1:
+            self.metrics.inc('reverts_total')
+        return tx_receipt
+
+    def watch_tracker(self, tracker, nonces):
+        self.metrics.gauge('in_flight', tracker.in_flight)
+
+        def nonce_gap():
+            next_nonce, mined_upto = nonces.peek(), tracker.mined_upto
+            return 0 if next_nonce is None or mined_upto is None else next_nonce - mined_upto
+        self.metrics.gauge('nonce_gap', nonce_gap)
+
+    def report_rpc_usage(self):
+        requests_made, calls_made = self.rpc_stats.end_reading()
+        print(f"   📡 RPC: {requests_made} HTTP requests ({calls_made} calls) for this reading, "
+              f"{self.rpc_stats.per_reading():.2f} requests/reading on average")
+
+    def run_pipelined(self, pipeline_config):
+        """Keep up to `max_in_flight` readings in flight instead of waiting for each receipt."""
+        print(f"Starting PIPELINED temperature simulation for Shipment ID: {self.shipment_id}")
+        sim_config = self.sim_config
+
+        def on_confirmed(pending, receipt):
+            tx_hash_hex = Web3.to_hex(receipt.transactionHash)
+            outcome = "✅ Transaction confirmed" if receipt.status == 1 else "❌ Transaction FAILED (reverted)"
+            print(f"{outcome} in block: {receipt.blockNumber} (nonce {pending.nonce}, {pending.label})")
+            print(f"   View on Etherscan: https://sepolia.etherscan.io/tx/{tx_hash_hex}")
+
+        # Filled on the tracker thread and re-submitted by this loop, since submit() may block on a slot
+        dropped = queue.Queue()
+
+        def on_dropped(pending):
+            print(f"❌ Reading {pending.label} was dropped: nonce {pending.nonce} was used by another transaction. "
+                  f"Sending it again.")
+            dropped.put(pending)
+
+        nonces = NonceManager(self.w3, self.wallet_address)
+        tracker = ReceiptTracker(
+            self.w3, self.signer, nonces,
+            max_in_flight=pipeline_config.get('max_in_flight', 8),
+            poll_seconds=pipeline_config.get('receipt_poll_seconds', 2),
+            replace_after_seconds=pipeline_config.get('replace_after_seconds', 90),
+            gas_bump_percent=pipeline_config.get('gas_bump_percent', 12.5),
+            on_confirmed=on_confirmed,
+            on_dropped=on_dropped,
+            metrics=self.metrics,
+        ).start()
+        self.watch_tracker(tracker, nonces)
+
+        try:
+            while True:
+                try:
+                    while not dropped.empty():
+                        lost = dropped.get()
+                        pending = tracker.submit(lost.tx, label=lost.label)
+                        print(f"Reading {lost.label} re-sent with nonce {pending.nonce}: {pending.latest_hash}")
+
+                    temperature = generate_temperature_reading(sim_config)
+                    temp_scaled = int(temperature * 100)
+                    print(f"\n[{time.ctime()}] 🌡️  Generated reading: {temperature:.2f}°C (Scaled: {temp_scaled})")
+                    self.record_reading(temp_scaled)
+                    self.rpc_stats.begin_reading()
+
+                    try:
+                        # The nonce is filled in by the tracker, so it is not part of the batch
+                        tx_data = self.prepare_reading(temp_scaled, with_nonce=False)
+                    except ContractLogicError as e:
+                        print("❌ Preflight check FAILED. The transaction will revert.")
+                        print(f"   Reason from contract: {e}")
+                        time.sleep(sim_config['interval_seconds'])
+                        continue
+
+                    pending = tracker.submit(tx_data, label=f"{self.shipment_id}@{temp_scaled}")
+                    print(f"Transaction sent with nonce {pending.nonce}: {pending.latest_hash} "
+                          f"({tracker.in_flight()} in flight)")
+                    self.report_rpc_usage()
+
+                except Exception as e:
+                    print(f"❌ An unexpected error occurred: {e}")
+                    self.metrics.inc('errors_total')
+                    try:
+                        nonces.resync()
+                    except Exception:
+                        pass
+
+                time.sleep(sim_config['interval_seconds'])
+        finally:
+            tracker.stop(drain=False)
+
+    def run_outbox(self, outbox_config):
+        """Commit every reading to the durable outbox first; a background sender gets it on-chain."""
+        print(f"Starting temperature simulation with a durable outbox for Shipment ID: {self.shipment_id}")
+        sim_config = self.sim_config
+        outbox_path = outbox_config.get('path', 'outbox.db')
+        if not os.path.isabs(outbox_path):
+            outbox_path = os.path.join(script_dir, outbox_path)
+        outbox = Outbox(outbox_path)
+
+        def on_confirmed(pending, receipt):
+            outcome = "✅ Reading confirmed" if receipt.status == 1 else "❌ Reading FAILED (reverted)"
+            print(f"{outcome} #{pending.label} in block: {receipt.blockNumber} (nonce {pending.nonce})")
+            print(f"   View on Etherscan: https://sepolia.etherscan.io/tx/{Web3.to_hex(receipt.transactionHash)}")
+
+        sender = OutboxSender(self, outbox, outbox_config, on_confirmed=on_confirmed).start()
+        self.watch_tracker(sender.tracker, sender.nonces)
+        self.metrics.gauge('outbox_backlog', outbox.backlog)
+
+        try:
+            while True:
+                try:
+                    temperature = generate_temperature_reading(sim_config)
+                    temp_scaled = int(temperature * 100)
+                    reading_id = outbox.append(self.shipment_id, int(time.time()), temp_scaled)
+                    self.record_reading(temp_scaled)
+                    print(f"\n[{time.ctime()}] 🌡️  Stored reading #{reading_id}: {temperature:.2f}°C "
+                          f"(Scaled: {temp_scaled}), {outbox.backlog()} waiting to be confirmed")
+                except Exception as e:
+                    print(f"❌ An unexpected error occurred: {e}")
+                    self.metrics.inc('errors_total')
 
-            # --- THIS IS YOUR PREFLIGHT CHECK ---
-            try:
-                # Simulate the transaction call to check for reverts
-                pharma_contract.functions.recordTemperature(
-                    SHIPMENT_ID,
-                    temp_scaled
-                ).call({'from': wallet_address})
-                print("✅ Preflight check passed. Proceeding to send transaction...")
-            except ContractLogicError as e:
-                print("❌ Preflight check FAILED. The transaction will revert.")
-                print(f"   Reason from contract: {e}")
-                # Wait for the next interval before trying again
                 time.sleep(sim_config['interval_seconds'])
-                continue # Skip the rest of the loop
-            
-            # --- Build, Sign, and Send the Transaction ---
-            print("Building transaction...")
-            nonce = w3.eth.get_transaction_count(wallet_address)
-            tx_data = pharma_contract.functions.recordTemperature(
-                SHIPMENT_ID, temp_scaled
-            ).build_transaction({
-                'chainId': w3.eth.chain_id,
-                'gas': 200000,
-                'gasPrice': w3.eth.gas_price,
-                'nonce': nonce,
-            })
-            
-            signed_tx = w3.eth.account.sign_transaction(tx_data, private_key=PRIVATE_KEY)
-            
-            print("Sending transaction to the network...")
-            # Use .raw if available (web3.py v6+), otherwise fallback for safety
-            raw_tx = signed_tx.raw if hasattr(signed_tx, 'raw') else signed_tx.raw_transaction
-            tx_hash = w3.eth.send_raw_transaction(raw_tx)
-            
-            # --- THIS IS YOUR ETHERSCAN LINK FIX ---
-            tx_hash_hex = Web3.to_hex(tx_hash)
-            print(f"Transaction sent! Hash: {tx_hash_hex}. Waiting for confirmation...")
-            
-            tx_receipt = w3.eth.wait_for_transaction_receipt(tx_hash, timeout=180)
-            
-            if tx_receipt.status == 1:
-                print(f"✅ Transaction confirmed in block: {tx_receipt.blockNumber}")
-                print(f"   View on Etherscan: https://sepolia.etherscan.io/tx/{tx_hash_hex}")
+        finally:
+            sender.stop()
+
+    def submit_window(self, store, tracker, root):
+        """Preflight a stored window's recordTemperatureBatch and hand it to `tracker`. Returns the PendingTx."""
+        window = store.window(root)
+        readings = store.window_readings(root)
+        breaches = [(r['temperature'], r['timestamp']) for r in readings
+                    if r['temperature'] < 200 or r['temperature'] > 800]
+        calldata = Web3.to_bytes(hexstr=self.pharma_contract.encode_abi("recordTemperatureBatch", args=[
+            window['shipment_id'],
+            Web3.to_bytes(hexstr=root),
+            window['reading_count'],
+            window['min_temp'],
+            window['max_temp'],
+            [temp for temp, _ in breaches],
+            [ts for _, ts in breaches],
+        ]))
+
+        try:
+            # The nonce comes from the tracker, which stores it with the hash before broadcasting
+            tx_data = self.prepare_transaction(calldata, with_nonce=False, gas=150000 + 40000 * len(breaches))
+        except ContractLogicError as e:
+            print("❌ Preflight check FAILED for the window. It stays in the proof store for a retry.")
+            print(f"   Reason from contract: {e}")
+            return None
+
+        pending = tracker.submit(tx_data, label=root)
+        print(f"Window {root} sent with nonce {pending.nonce} ({window['reading_count']} readings, "
+              f"{len(breaches)} breaches). Hash: {pending.latest_hash}")
+        return pending
+
+    def window_tracker(self, store, batch_config):
+        """A started ReceiptTracker that keeps `store` in step with every window transaction."""
+        def on_signed(signed):
+            for pending, tx_hash in signed:
+                store.mark_signed(pending.label, pending.nonce, pending.tx, tx_hash)
+
+        def on_confirmed(pending, receipt):
+            self.window_mined(store, pending.label, receipt)
+
+        def on_dropped(pending):
+            print(f"❌ Window {pending.label} lost nonce {pending.nonce} to another transaction, "
+                  f"sending it again with the next window.")
+            store.requeue(pending.label)
+
+        nonces = NonceManager(self.w3, self.wallet_address)
+        tracker = ReceiptTracker(
+            self.w3, self.signer, nonces,
+            max_in_flight=batch_config.get('max_in_flight', 4),
+            poll_seconds=batch_config.get('receipt_poll_seconds', 2),
+            replace_after_seconds=batch_config.get('replace_after_seconds', 90),
+            gas_bump_percent=batch_config.get('gas_bump_percent', 12.5),
+            drop_after_seconds=batch_config.get('drop_after_seconds', 120),
+            on_signed=on_signed,
+            on_confirmed=on_confirmed,
+            on_dropped=on_dropped,
+            metrics=self.metrics,
+        )
+        self.watch_tracker(tracker, nonces)
+
+        # Windows signed by an earlier run: settle the mined ones, keep tracking the rest at their nonce
+        for window in store.in_flight():
+            receipt = find_receipt(self.w3, window['tx_hashes'])
+            if receipt is not None:
+                self.window_mined(store, window['root'], receipt)
             else:
-                print(f"❌ Transaction FAILED (reverted) in block: {tx_receipt.blockNumber}")
-                print(f"   View on Etherscan: https://sepolia.etherscan.io/tx/{tx_hash_hex}")
+                tracker.adopt(window['nonce'], window['tx'], window['tx_hashes'], label=window['root'])
+        return tracker.start()
 
-        except Exception as e:
-            print(f"❌ An unexpected error occurred: {e}")
+    def window_mined(self, store, root, receipt):
+        tx_hash_hex = Web3.to_hex(receipt.transactionHash)
+        if receipt.status != 1:
+            print(f"❌ Window transaction FAILED (reverted) in block: {receipt.blockNumber}. "
+                  f"It stays in the proof store for a retry.")
+            store.requeue(root)
+            return
+        store.mark_committed(root, tx_hash_hex, receipt.blockNumber)
+        print(f"✅ Window {root} committed in block: {receipt.blockNumber}")
+        print(f"   View on Etherscan: https://sepolia.etherscan.io/tx/{tx_hash_hex}")
 
-        time.sleep(sim_config['interval_seconds'])
+    def run_batched(self, batch_config):
+        """Buffer readings into windows and commit one Merkle root per window."""
+        print(f"Starting BATCHED temperature simulation for Shipment ID: {self.shipment_id}")
+        sim_config = self.sim_config
+        window_size = batch_config.get('window_size', 20)
+        window_seconds = batch_config.get('window_seconds')
+        store_path = batch_config.get('proof_store', 'proofs.db')
+        if not os.path.isabs(store_path):
+            store_path = os.path.join(script_dir, store_path)
+        store = ProofStore(store_path)
+        tracker = self.window_tracker(store, batch_config)
+        key = shipment_key(self.shipment_id)
+        buffer = []
+
+        try:
+            while True:
+                try:
+                    temperature = generate_temperature_reading(sim_config)
+                    temp_scaled = int(temperature * 100)
+                    buffer.append((int(time.time()), temp_scaled))
+                    self.record_reading(temp_scaled)
+                    print(f"\n[{time.ctime()}] 🌡️  Buffered reading {len(buffer)}/{window_size}: "
+                          f"{temperature:.2f}°C (Scaled: {temp_scaled})")
+
+                    window_full = len(buffer) >= window_size
+                    window_expired = window_seconds and time.time() - buffer[0][0] >= window_seconds
+                    if window_full or window_expired:
+                        tree = MerkleTree([leaf_hash(key, i, ts, temp) for i, (ts, temp) in enumerate(buffer)])
+                        # Leaves and proofs are stored before submitting, so nothing is lost if the send fails
+                        store.save_window(self.shipment_id, tree, buffer, int(time.time()))
+                        buffer = []
+                        # Signed windows are the tracker's until they are mined or dropped
+                        for window in store.unsent():
+                            self.submit_window(store, tracker, window['root'])
+
+                except Exception as e:
+                    print(f"❌ An unexpected error occurred: {e}")
+                    self.metrics.inc('errors_total')
+
+                time.sleep(sim_config['interval_seconds'])
+        finally:
+            tracker.stop(drain=False)
+
+    def run(self):
+        """Send one reading per interval and wait for each receipt."""
+        sim_config = self.sim_config
+        print(f"Starting temperature simulation for Shipment ID: {self.shipment_id}")
+        while True:
+            try:
+                temperature = generate_temperature_reading(sim_config)
+                temp_scaled = int(temperature * 100)
+                print(f"\n[{time.ctime()}] 🌡️  Generated reading: {temperature:.2f}°C (Scaled: {temp_scaled})")
+                self.record_reading(temp_scaled)
+                self.rpc_stats.begin_reading()
+
+                # --- THIS IS YOUR PREFLIGHT CHECK ---
+                try:
+                    # Simulate the transaction call to check for reverts, batched with the nonce and fee lookups
+                    tx_data = self.prepare_reading(temp_scaled)
+                    print("✅ Preflight check passed. Proceeding to send transaction...")
+                except ContractLogicError as e:
+                    print("❌ Preflight check FAILED. The transaction will revert.")
+                    print(f"   Reason from contract: {e}")
+                    # Wait for the next interval before trying again
+                    time.sleep(sim_config['interval_seconds'])
+                    continue # Skip the rest of the loop
+
+                # --- Sign and Send the Transaction ---
+                print("Sending transaction to the network...")
+                tx_hash = self.sign_and_send(tx_data)
+
+                # --- THIS IS YOUR ETHERSCAN LINK FIX ---
+                tx_hash_hex = Web3.to_hex(tx_hash)
+                print(f"Transaction sent! Hash: {tx_hash_hex}. Waiting for confirmation...")
+
+                tx_receipt = self.wait_for_receipt(tx_hash)
+
+                if tx_receipt.status == 1:
+                    print(f"✅ Transaction confirmed in block: {tx_receipt.blockNumber}")
+                    print(f"   View on Etherscan: https://sepolia.etherscan.io/tx/{tx_hash_hex}")
+                else:
+                    print(f"❌ Transaction FAILED (reverted) in block: {tx_receipt.blockNumber}")
+                    print(f"   View on Etherscan: https://sepolia.etherscan.io/tx/{tx_hash_hex}")
+                self.report_rpc_usage()
+
+            except Exception as e:
+                print(f"❌ An unexpected error occurred: {e}")
+                self.metrics.inc('errors_total')
+
+            time.sleep(sim_config['interval_seconds'])
+
+    def start(self):
+        modes = {'outbox': self.run_outbox, 'pipeline': self.run_pipelined, 'batch': self.run_batched}
+        enabled = [name for name in modes if (self.config.get(name) or {}).get('enabled')]
+        if len(enabled) > 1:
+            raise Exception(f"Only one submission mode can be enabled in config.yaml, "
+                            f"but {', '.join(enabled)} are. Set `enabled: false` on the others.")
+        if enabled:
+            return modes[enabled[0]](self.config[enabled[0]])
+        return self.run()
+
+def main():
+    print("✅ IoT Simulator for PharmaChain contract started.")
+    Simulator.from_env().start()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,255 @@
+# simulator/benchmark.py
+# Offline benchmark for the simulator's submission path.
+#
+# Deploys PharmaChain to an in-process EVM (eth-tester / py-evm), grants
+# ORACLE_ROLE, creates the shipments and then submits readings through the
+# simulator's own Simulator objects (batched preflight, fee cache, calldata
+# template, lean signer) and receipt tracker.
+# Reports readings/s, submit-to-receipt latency percentiles (from signing, so
+# time spent waiting for an in-flight slot is not included in any mode), RPC
+# usage and gas per reading as JSON, to keep as a regression baseline before
+# each deploy.
+#
+#   pip install -r simulator/requirements-bench.txt
+#   npx hardhat compile
+#   python simulator/benchmark.py --shipments 10 --readings 500 --mode pipelined
+#   python simulator/benchmark.py --readings 2000 --mode drain   # backlog after an outage
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+from web3 import EthereumTesterProvider, Web3
+from web3.exceptions import ContractLogicError
+
+from app import Simulator, load_config
+from metrics import Metrics
+from outbox import Outbox, OutboxSender
+from rpc import CountingProviderMixin, RpcStats
+from sensor import generate_temperature_reading
+from tx_pipeline import NonceManager, ReceiptTracker
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+default_artifact = os.path.join(script_dir, '..', 'artifacts', 'contracts', 'PharmaChain.sol', 'PharmaChain.json')
+
+
+class CountingTesterProvider(CountingProviderMixin, EthereumTesterProvider):
+    """In-process node stand-in. Batches are answered call by call but counted as one request,
+    the way a JSON-RPC batch over HTTP would be."""
+
+    def make_batch_request(self, requests):
+        self.stats.record(1, len(requests))
+        return [EthereumTesterProvider.make_request(self, method, params) for method, params in requests]
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+# --- 1. CHAIN SETUP ---
+def load_artifact(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            artifact = json.load(f)
+    except FileNotFoundError:
+        raise Exception(f"Compiled contract not found at {path}. Run `npx hardhat compile` first.")
+    return artifact['abi'], artifact['bytecode']
+
+
+def deploy(w3, abi, bytecode, shipment_ids):
+    """Deploy PharmaChain, grant roles and create the shipments. Returns (contract, oracle private key)."""
+    admin = w3.eth.accounts[0]
+    factory = w3.eth.contract(abi=abi, bytecode=bytecode)
+    receipt = w3.eth.wait_for_transaction_receipt(factory.constructor(admin).transact({'from': admin}))
+    contract = w3.eth.contract(address=receipt.contractAddress, abi=abi)
+
+    oracle_key = w3.provider.ethereum_tester.backend.account_keys[1]
+    oracle_address = oracle_key.public_key.to_checksum_address()
+    contract.functions.grantRoleTo(Web3.keccak(text="ORACLE_ROLE"), oracle_address).transact({'from': admin})
+    contract.functions.grantRoleTo(Web3.keccak(text="MANUFACTURER_ROLE"), admin).transact({'from': admin})
+    for shipment_id in shipment_ids:
+        contract.functions.createShipment(shipment_id, admin).transact({'from': admin})
+    return contract, oracle_key.to_bytes()
+
+
+# --- 2. SUBMISSION PATHS ---
+class Bench:
+    def __init__(self, w3, contract, oracle_key, shipment_ids, config, metrics):
+        self.w3 = w3
+        self.metrics = metrics
+        # One Simulator per shipment, as each oracle process would run; they share the chain and fee cache
+        self.simulators = {
+            shipment_id: Simulator(w3, contract.address, oracle_key, config, shipment_id, abi=contract.abi, metrics=metrics)
+            for shipment_id in shipment_ids
+        }
+        first = next(iter(self.simulators.values()))
+        self.oracle = first.signer
+        for simulator in self.simulators.values():
+            simulator.fee_cache = first.fee_cache
+            simulator._chain_id = first.chain_id
+        self.latencies = []
+        self.gas_used = []
+        self.reverted = 0
+        self.preflight_failed = 0
+
+    def record(self, latency, receipt):
+        self.latencies.append(latency)
+        self.gas_used.append(receipt.gasUsed)
+        if receipt.status != 1:
+            self.reverted += 1
+
+    def run_sequential(self, readings, pace):
+        for shipment_id, temp_scaled in readings:
+            pace()
+            try:
+                tx = self.simulators[shipment_id].prepare_reading(temp_scaled, with_nonce=True)
+            except ContractLogicError:
+                self.preflight_failed += 1
+                continue
+            simulator = self.simulators[shipment_id]
+            started = time.perf_counter()
+            tx_hash = simulator.sign_and_send(tx)
+            receipt = simulator.wait_for_receipt(tx_hash)
+            self.record(time.perf_counter() - started, receipt)
+
+    def run_pipelined(self, readings, pace, max_in_flight):
+        lock = threading.Lock()
+
+        def on_confirmed(pending, receipt):
+            # From when the tracker took the reading (after a slot was free), as in drain mode
+            with lock:
+                self.record(time.monotonic() - pending.submitted_at, receipt)
+
+        tracker = ReceiptTracker(
+            self.w3, self.oracle, NonceManager(self.w3, self.oracle.address),
+            max_in_flight=max_in_flight, poll_seconds=0.01, on_confirmed=on_confirmed, metrics=self.metrics,
+        ).start()
+        for i, (shipment_id, temp_scaled) in enumerate(readings):
+            pace()
+            try:
+                tx = self.simulators[shipment_id].prepare_reading(temp_scaled, with_nonce=False)
+            except ContractLogicError:
+                self.preflight_failed += 1
+                continue
+            tracker.submit(tx, label=i)
+        tracker.stop(drain=True, timeout=120)
+
+    def run_drain(self, readings, max_in_flight):
+        """Fill an outbox with every reading first, as after a provider outage, then time the drain."""
+        with tempfile.TemporaryDirectory() as tmp:
+            outbox = Outbox(os.path.join(tmp, 'outbox.db'))
+            for shipment_id, temp_scaled in readings:
+                outbox.append(shipment_id, int(time.time()), temp_scaled)
+
+            lock = threading.Lock()
+
+            def on_confirmed(pending, receipt):
+                with lock:
+                    self.record(time.monotonic() - pending.submitted_at, receipt)
+
+            started = time.perf_counter()
+            sender = OutboxSender(next(iter(self.simulators.values())), outbox, {
+                'max_in_flight': max_in_flight, 'receipt_poll_seconds': 0.01, 'idle_seconds': 0.01,
+            }, on_confirmed=on_confirmed).start()
+            while outbox.backlog() and time.perf_counter() - started < 600:
+                time.sleep(0.01)
+            sender.stop(timeout=10)
+            self.preflight_failed += outbox.counts().get('rejected', 0)
+            outbox.conn.close()
+
+
+# --- 3. ENTRY POINT ---
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the simulator's submission path against an in-process EVM.")
+    parser.add_argument("--artifact", default=default_artifact, help="Hardhat artifact for PharmaChain")
+    parser.add_argument("--shipments", type=int, default=10)
+    parser.add_argument("--readings", type=int, default=200, help="Total readings across all shipments")
+    parser.add_argument("--rate", type=float, default=0, help="Target readings/s (0 = as fast as possible)")
+    parser.add_argument("--mode", choices=["sequential", "pipelined", "drain"], default="pipelined")
+    parser.add_argument("--max-in-flight", type=int, default=8)
+    parser.add_argument("--no-batch", action="store_true", help="Send hot-path RPC calls one by one")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-metrics", action="store_true", help="Disable stage instrumentation (to measure its overhead)")
+    parser.add_argument("--trace", help="Write a JSONL stage trace here")
+    parser.add_argument("--out", help="Write the JSON report here as well as to stdout")
+    args = parser.parse_args()
+
+    config = load_config()
+    config['rpc'] = {**(config.get('rpc') or {}), 'batch_requests': not args.no_batch, 'receipt_poll_seconds': 0.01}
+    random.seed(args.seed)
+
+    stats = RpcStats()
+    w3 = Web3(CountingTesterProvider(stats=stats))
+    abi, bytecode = load_artifact(args.artifact)
+    shipment_ids = [f"BENCH-{i:04d}" for i in range(args.shipments)]
+    contract, oracle_key = deploy(w3, abi, bytecode, shipment_ids)
+
+    readings = [(shipment_ids[i % args.shipments], int(generate_temperature_reading(config['simulation']) * 100))
+                for i in range(args.readings)]
+    metrics = Metrics(enabled=not args.no_metrics, trace_path=args.trace)
+    bench = Bench(w3, contract, oracle_key, shipment_ids, config, metrics)
+
+    interval = 1.0 / args.rate if args.rate else 0
+    next_at = [time.perf_counter()]
+
+    def pace():
+        if interval:
+            delay = next_at[0] - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            next_at[0] += interval
+
+    # Only the submission phase counts towards RPC usage
+    baseline_requests, baseline_calls = stats.requests, stats.calls
+    started = time.perf_counter()
+    if args.mode == "sequential":
+        bench.run_sequential(readings, pace)
+    elif args.mode == "drain":
+        bench.run_drain(readings, args.max_in_flight)
+    else:
+        bench.run_pipelined(readings, pace, args.max_in_flight)
+    elapsed = time.perf_counter() - started
+
+    confirmed = len(bench.latencies)
+    per_reading = (lambda n: round(n / confirmed, 3)) if confirmed else (lambda n: None)
+    report = {
+        'mode': args.mode,
+        'batch_requests': not args.no_batch,
+        'shipments': args.shipments,
+        'readings': args.readings,
+        'target_rate': args.rate,
+        'confirmed': confirmed,
+        'reverted': bench.reverted,
+        'preflight_failed': bench.preflight_failed,
+        'elapsed_seconds': round(elapsed, 4),
+        'readings_per_second': round(confirmed / elapsed, 2) if elapsed else None,
+        'latency_ms': {
+            f'p{pct}': round(percentile(bench.latencies, pct) * 1000, 3) if confirmed else None
+            for pct in (50, 95, 99)
+        },
+        'rpc_requests_per_reading': per_reading(stats.requests - baseline_requests),
+        'rpc_calls_per_reading': per_reading(stats.calls - baseline_calls),
+        'gas_per_reading': per_reading(sum(bench.gas_used)),
+        'stage_mean_ms': {stage: round(mean * 1000, 3) for stage, (_, mean) in sorted(metrics.means().items())},
+    }
+    metrics.close()
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            f.write(output + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,76 @@
+# simulator/fast_tx.py
+# Lean per-reading transaction path for recordTemperature.
+#
+# The calldata for a shipment only differs in the int256 temperature word, so
+# it is ABI-encoded once and patched per reading. Transactions are RLP-encoded
+# and signed directly with the prepared key, skipping web3's contract machinery
+# and eth-account's dict validation. The output is byte-for-byte what
+# eth-account produces for the same transaction.
+from typing import NamedTuple
+
+import rlp
+from eth_keys import keys
+from eth_utils import keccak, to_canonical_address
+from hexbytes import HexBytes
+
+
+class RecordTemperatureTemplate:
+    """recordTemperature(string shipmentId, int256 tempScaled100) calldata for one shipment."""
+
+    def __init__(self, contract, shipment_id):
+        encoded = HexBytes(contract.encode_abi("recordTemperature", args=[shipment_id, 0]))
+        # selector (4) + string offset word (32) | temperature word (32) | string tail
+        self.prefix = bytes(encoded[:36])
+        self.suffix = bytes(encoded[68:])
+
+    def calldata(self, temp_scaled):
+        return self.prefix + temp_scaled.to_bytes(32, 'big', signed=True) + self.suffix
+
+
+class SignedTx(NamedTuple):
+    raw_transaction: bytes
+    hash: bytes
+
+
+def _as_bytes(value):
+    if isinstance(value, (bytes, bytearray)):
+        return bytes(value)
+    return bytes(HexBytes(value)) if value else b''
+
+
+class LeanSigner:
+    """Signs legacy (EIP-155) and EIP-1559 transactions from a plain dict.
+
+    Exposes `address` and `sign_transaction(tx)` like a LocalAccount, so it can
+    be handed to the ReceiptTracker and fleet wallets unchanged.
+    """
+
+    def __init__(self, private_key):
+        self._key = keys.PrivateKey(bytes(HexBytes(private_key)))
+        self.address = self._key.public_key.to_checksum_address()
+        self._to_cache = {}
+
+    def _to(self, to):
+        if isinstance(to, (bytes, bytearray)):
+            return bytes(to)
+        canonical = self._to_cache.get(to)
+        if canonical is None:
+            canonical = self._to_cache[to] = to_canonical_address(to)
+        return canonical
+
+    def sign_transaction(self, tx):
+        to = self._to(tx['to'])
+        data = _as_bytes(tx.get('data'))
+        value = tx.get('value', 0)
+        chain_id = tx['chainId']
+
+        if 'maxFeePerGas' in tx:
+            fields = [chain_id, tx['nonce'], tx['maxPriorityFeePerGas'], tx['maxFeePerGas'],
+                      tx['gas'], to, value, data, []]
+            signature = self._key.sign_msg_hash(keccak(b'\x02' + rlp.encode(fields)))
+            raw = b'\x02' + rlp.encode(fields + [signature.v, signature.r, signature.s])
+        else:
+            fields = [tx['nonce'], tx['gasPrice'], tx['gas'], to, value, data]
+            signature = self._key.sign_msg_hash(keccak(rlp.encode(fields + [chain_id, 0, 0])))
+            raw = rlp.encode(fields + [signature.v + 35 + 2 * chain_id, signature.r, signature.s])
+        return SignedTx(raw, keccak(raw))
@@ -0,0 +1,298 @@
+# simulator/fleet.py
+# Fleet mode: one asyncio process simulating many shipments.
+#
+# Every shipment is a small record on a shared schedule (a heap of due times),
+# so memory stays flat per shipment. Readings go through a bounded queue to a
+# fixed pool of sender workers; when the RPC endpoint falls behind the queue
+# fills up and the scheduler waits instead of piling up requests. Each
+# ORACLE_ROLE wallet hands out its own nonces in order while its sends run
+# concurrently, and several keys can submit in parallel without ever colliding.
+import asyncio
+import heapq
+import math
+import os
+import time
+
+import aiohttp
+from dotenv import load_dotenv
+from web3 import AsyncWeb3, Web3
+from web3.middleware import ExtraDataToPOAMiddleware
+from web3.exceptions import ContractLogicError
+
+from app import load_abi, load_config
+from fast_tx import LeanSigner, RecordTemperatureTemplate
+from sensor import FleetSensorModel, generate_temperature_reading
+from tx_pipeline import is_already_known, is_nonce_too_low
+
+# --- 1. SETUP AND CONFIGURATION ---
+script_dir = os.path.dirname(os.path.abspath(__file__))
+
+
+def load_fleet_shipments(fleet_config, base_sim):
+    """Return a list of (shipment_id, simulation_config) from an explicit list and/or a range.
+
+    Shipments without an override share the base `simulation` dict, so a large
+    fleet costs one small tuple per shipment.
+    """
+    ids = list(fleet_config.get('shipment_ids') or [])
+    id_range = fleet_config.get('shipment_range')
+    if id_range:
+        prefix = id_range.get('prefix', '')
+        width = id_range.get('width', 0)
+        start = id_range.get('start', 1)
+        ids += [f"{prefix}{i:0{width}d}" for i in range(start, start + id_range['count'])]
+
+    overrides = fleet_config.get('overrides') or {}
+    unknown = set(overrides) - set(ids)
+    if unknown:
+        raise Exception(f"Overrides given for shipments not in the fleet: {sorted(unknown)}")
+
+    shipments = []
+    seen = set()
+    for shipment_id in ids:
+        if shipment_id in seen:
+            continue
+        seen.add(shipment_id)
+        override = overrides.get(shipment_id)
+        shipments.append((shipment_id, {**base_sim, **override} if override else base_sim))
+    if not shipments:
+        raise Exception("Fleet mode needs `fleet.shipment_ids` or `fleet.shipment_range` in config.yaml.")
+    return shipments
+
+
+# --- 2. WALLETS ---
+class OracleWallet:
+    """One ORACLE_ROLE key. Nonces are handed out in order under `lock`; the sends run concurrently."""
+
+    def __init__(self, private_key):
+        self.account = LeanSigner(private_key)
+        self.address = self.account.address
+        self.lock = asyncio.Lock()
+        self.nonce = None
+        # Nonces whose send failed, handed out again first so they leave no gap
+        self.released = []
+        self.sent = 0
+
+    async def resync(self, w3):
+        """Move past nonces used elsewhere. Call with `lock` held."""
+        chain_nonce = await w3.eth.get_transaction_count(self.address, 'pending')
+        self.nonce = chain_nonce if self.nonce is None else max(self.nonce, chain_nonce)
+        self.released = [n for n in self.released if n >= chain_nonce]
+        heapq.heapify(self.released)
+
+    async def reserve(self, w3):
+        async with self.lock:
+            if self.released:
+                return heapq.heappop(self.released)
+            if self.nonce is None:
+                await self.resync(w3)
+            nonce = self.nonce
+            self.nonce += 1
+            return nonce
+
+    async def send(self, w3, tx):
+        nonce = await self.reserve(w3)
+        for attempt in range(2):
+            tx['nonce'] = nonce
+            signed = self.account.sign_transaction(tx)
+            try:
+                tx_hash = await w3.eth.send_raw_transaction(signed.raw_transaction)
+            except Exception as e:
+                if is_already_known(e):
+                    tx_hash = signed.hash
+                elif is_nonce_too_low(e) and attempt == 0:
+                    # Used by a transaction sent from elsewhere: take a fresh one
+                    async with self.lock:
+                        await self.resync(w3)
+                    nonce = await self.reserve(w3)
+                    continue
+                else:
+                    if not is_nonce_too_low(e):
+                        heapq.heappush(self.released, nonce)
+                    raise
+            self.sent += 1
+            return Web3.to_hex(tx_hash)
+
+
+# --- 3. FLEET ---
+class Fleet:
+    def __init__(self, w3, contract, wallets, shipments, fleet_config, model_config=None):
+        self.w3 = w3
+        self.contract = contract
+        self.wallets = wallets
+        self.shipments = shipments
+        # Fixed before preflight() filters the list, so a shipment is always sent by the wallet it was checked with
+        self.shipment_wallets = [wallets[i % len(wallets)] for i in range(len(shipments))]
+        self.workers = fleet_config.get('max_concurrent_sends', 32)
+        self.queue = asyncio.Queue(maxsize=fleet_config.get('queue_size', 1000))
+        self.gas_limit = fleet_config.get('gas_limit', 200000)
+        self.gas_refresh_seconds = fleet_config.get('gas_price_refresh_seconds', 12)
+        self.stats_seconds = fleet_config.get('stats_interval_seconds', 30)
+        self.max_retries = fleet_config.get('max_send_retries', 3)
+        self.chain_id = None
+        self.gas_price = None
+        self.templates = []
+        self.model_config = model_config or {}
+        self.model = None
+        self.stats = {'generated': 0, 'sent': 0, 'retried': 0, 'failed': 0, 'lagged': 0, 'dropouts': 0}
+
+    async def preflight(self):
+        """Drop shipments whose recordTemperature would revert (unknown ID, missing role)."""
+        semaphore = asyncio.Semaphore(self.workers)
+
+        async def check(index, shipment_id):
+            wallet = self.shipment_wallets[index]
+            async with semaphore:
+                try:
+                    await self.contract.functions.recordTemperature(shipment_id, 400).call({'from': wallet.address})
+                    return True
+                except ContractLogicError as e:
+                    print(f"❌ Preflight check FAILED for {shipment_id}, skipping it. Reason: {e}")
+                    return False
+
+        results = await asyncio.gather(*(check(i, sid) for i, (sid, _) in enumerate(self.shipments)))
+        self.shipments = [s for s, ok in zip(self.shipments, results) if ok]
+        self.shipment_wallets = [w for w, ok in zip(self.shipment_wallets, results) if ok]
+
+    async def refresh_gas_price(self):
+        while True:
+            try:
+                self.gas_price = await self.w3.eth.gas_price
+            except Exception as e:
+                print(f"⚠️  Gas price refresh failed, keeping {self.gas_price}: {e}")
+            await asyncio.sleep(self.gas_refresh_seconds)
+
+    async def schedule(self):
+        """Produce readings when each shipment is due. Blocks on the queue when senders fall behind."""
+        now = time.monotonic()
+        count = len(self.shipments)
+        if self.model_config.get('enabled'):
+            tick = self.model_config.get('tick_seconds') or min(sim['interval_seconds'] for _, sim in self.shipments)
+            self.model = FleetSensorModel(self.shipments, self.model_config, tick)
+        # Spread first readings over one interval so the fleet does not fire in lockstep
+        heap = [(now + sim['interval_seconds'] * i / count, i) for i, (_, sim) in enumerate(self.shipments)]
+        heapq.heapify(heap)
+
+        while heap:
+            due, index = heap[0]
+            delay = due - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+            heapq.heappop(heap)
+
+            shipment_id, sim = self.shipments[index]
+            if self.model is not None:
+                temperature = self.model.advance_to(time.monotonic() - now)[index]
+            else:
+                temperature = generate_temperature_reading(sim)
+            self.stats['generated'] += 1
+            if math.isnan(temperature):
+                # Sensor dropout: nothing is reported for this reading
+                self.stats['dropouts'] += 1
+            else:
+                await self.queue.put((index, int(temperature * 100)))
+
+            next_due = due + sim['interval_seconds']
+            if next_due < time.monotonic():
+                # Backpressure: skip ahead rather than bursting to catch up
+                self.stats['lagged'] += 1
+                next_due = time.monotonic() + sim['interval_seconds']
+            heapq.heappush(heap, (next_due, index))
+
+    async def send_worker(self):
+        while True:
+            index, temp_scaled = await self.queue.get()
+            shipment_id, _ = self.shipments[index]
+            wallet = self.shipment_wallets[index]
+            try:
+                for attempt in range(self.max_retries):
+                    try:
+                        # Built directly: the preflight already ran and gas is fixed, so build_transaction's
+                        # encoding and validation would only repeat work per reading
+                        tx = {
+                            'to': self.contract.address,
+                            'data': self.templates[index].calldata(temp_scaled),
+                            'value': 0,
+                            'chainId': self.chain_id,
+                            'gas': self.gas_limit,
+                            'gasPrice': self.gas_price,
+                        }
+                        await wallet.send(self.w3, tx)
+                        self.stats['sent'] += 1
+                        break
+                    except Exception as e:
+                        if attempt + 1 == self.max_retries:
+                            self.stats['failed'] += 1
+                            print(f"❌ Reading for {shipment_id} ({temp_scaled}) failed after {self.max_retries} attempts: {e}")
+                        else:
+                            # Retrying in place holds this worker, which is what throttles the scheduler
+                            self.stats['retried'] += 1
+                            await asyncio.sleep(2 ** attempt)
+            finally:
+                self.queue.task_done()
+
+    async def report(self):
+        while True:
+            await asyncio.sleep(self.stats_seconds)
+            stats = ", ".join(f"{k}={v}" for k, v in self.stats.items())
+            print(f"[{time.ctime()}] 📊 {len(self.shipments)} shipments | {stats} | queue={self.queue.qsize()}")
+
+    async def run(self):
+        self.chain_id = await self.w3.eth.chain_id
+        self.gas_price = await self.w3.eth.gas_price
+        await self.preflight()
+        if not self.shipments:
+            raise Exception("No shipment passed the preflight check.")
+        self.templates = [RecordTemperatureTemplate(self.contract, sid) for sid, _ in self.shipments]
+        print(f"Starting fleet simulation: {len(self.shipments)} shipments, "
+              f"{len(self.wallets)} oracle wallets, {self.workers} senders.")
+
+        tasks = [asyncio.create_task(self.send_worker()) for _ in range(self.workers)]
+        tasks.append(asyncio.create_task(self.refresh_gas_price()))
+        tasks.append(asyncio.create_task(self.report()))
+        try:
+            await self.schedule()
+        finally:
+            for task in tasks:
+                task.cancel()
+
+
+# --- 4. ENTRY POINT ---
+async def run_fleet():
+    load_dotenv(dotenv_path=os.path.join(script_dir, '..', '.env'))
+    alchemy_url = os.getenv("ALCHEMY_URL")
+    contract_address = os.getenv("CONTRACT_ADDRESS")
+    # Several ORACLE_ROLE keys may be given comma separated; fall back to the single simulator key
+    keys = [k.strip() for k in (os.getenv("ORACLE_PRIVATE_KEYS") or os.getenv("SIMULATOR_PRIVATE_KEY") or "").split(",") if k.strip()]
+
+    if not all([alchemy_url, contract_address, keys]):
+        raise Exception("Please set ALCHEMY_URL, CONTRACT_ADDRESS and ORACLE_PRIVATE_KEYS "
+                        "(or SIMULATOR_PRIVATE_KEY) in the root .env file.")
+
+    config = load_config()
+    fleet_config = config.get('fleet') or {}
+    shipments = load_fleet_shipments(fleet_config, config['simulation'])
+
+    contract_abi = load_abi()
+
+    provider = AsyncWeb3.AsyncHTTPProvider(alchemy_url)
+    w3 = AsyncWeb3(provider)
+    w3.middleware_onion.inject(ExtraDataToPOAMiddleware, layer=0)
+
+    # One bounded connection pool shared by every shipment
+    session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=fleet_config.get('max_connections', 20)))
+    await provider.cache_async_session(session)
+    try:
+        if not await w3.is_connected():
+            raise ConnectionError("🛑 Error: Could not connect to Ethereum node.")
+        wallets = [OracleWallet(key) for key in keys]
+        contract = w3.eth.contract(address=contract_address, abi=contract_abi)
+        await Fleet(w3, contract, wallets, shipments, fleet_config, config.get('sensor_model')).run()
+    finally:
+        await session.close()
+
+
+if __name__ == "__main__":
+    print("✅ IoT Fleet Simulator for PharmaChain contract started.")
+    asyncio.run(run_fleet())
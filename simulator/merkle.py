@@ -0,0 +1,56 @@
+# simulator/merkle.py
+# Merkle commitments for windows of temperature readings.
+#
+# Matches PharmaChain.verifyReading: leaves are
+# keccak256(keccak256(abi.encode(key, index, timestamp, tempScaled100))) and
+# pairs are hashed in sorted order (OpenZeppelin MerkleProof). An odd node at
+# the end of a level is carried up unchanged.
+from eth_abi import encode
+from web3 import Web3
+
+
+def shipment_key(shipment_id):
+    return Web3.keccak(text=shipment_id)
+
+
+def leaf_hash(key, index, timestamp, temp_scaled):
+    inner = Web3.keccak(encode(['bytes32', 'uint256', 'uint256', 'int256'], [key, index, timestamp, temp_scaled]))
+    return Web3.keccak(inner)
+
+
+def _hash_pair(a, b):
+    return Web3.keccak(a + b if a <= b else b + a)
+
+
+class MerkleTree:
+    def __init__(self, leaves):
+        if not leaves:
+            raise ValueError("A Merkle tree needs at least one leaf")
+        self.levels = [list(leaves)]
+        while len(self.levels[-1]) > 1:
+            level = self.levels[-1]
+            parents = [_hash_pair(level[i], level[i + 1]) for i in range(0, len(level) - 1, 2)]
+            if len(level) % 2:
+                parents.append(level[-1])
+            self.levels.append(parents)
+
+    @property
+    def root(self):
+        return self.levels[-1][0]
+
+    def proof(self, index):
+        """Sibling hashes from leaf `index` up to the root."""
+        proof = []
+        for level in self.levels[:-1]:
+            sibling = index ^ 1
+            if sibling < len(level):
+                proof.append(level[sibling])
+            index //= 2
+        return proof
+
+
+def verify(proof, root, leaf):
+    computed = leaf
+    for sibling in proof:
+        computed = _hash_pair(computed, sibling)
+    return computed == root
@@ -0,0 +1,314 @@
+# simulator/metrics.py
+# Low-overhead instrumentation for the reading pipeline.
+#
+# Stage latencies go into fixed-bucket histograms, events into counters, and
+# gauges are callbacks read only when /metrics is scraped. Everything is kept
+# in process and rendered in the Prometheus text format on request; an
+# optional JSONL trace records one line per stage for offline analysis.
+# Profilers are attached on demand with signals (see install_profiler_hooks).
+import bisect
+import cProfile
+import json
+import os
+import signal
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PREFIX = "pharmachain_"
+
+# Seconds; covers a local signature (~0.2ms) up to a slow block confirmation
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+HELP = {
+    'stage_seconds': "Latency of each stage of the reading pipeline",
+    'stage_errors_total': "Stages that raised, by stage",
+    'readings_total': "Temperature readings generated",
+    'breaches_total': "Readings outside the 2-8°C range",
+    'preflight_failures_total': "Readings whose preflight eth_call reverted",
+    'reverts_total': "Transactions mined with status 0",
+    'receipt_timeouts_total': "Transactions not mined before the receipt timeout",
+    'replacements_total': "Stuck transactions re-sent with bumped gas",
+    'dropped_total': "Transactions whose nonce was used by another transaction",
+    'errors_total': "Unexpected errors in the reading loop",
+    'in_flight': "Transactions sent and not yet confirmed",
+    'nonce_gap': "Next local nonce minus the last mined nonce",
+    'rpc_requests_total': "HTTP requests sent to the RPC endpoint",
+    'rpc_calls_total': "JSON-RPC calls sent to the RPC endpoint",
+    'outbox_backlog': "Readings in the outbox not yet confirmed on-chain",
+}
+
+
+def _label_text(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}"
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class _Stage:
+    __slots__ = ("metrics", "name", "fields", "started")
+
+    def __init__(self, metrics, name, fields):
+        self.metrics = metrics
+        self.name = name
+        self.fields = fields
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self.started
+        labels = (('stage', self.name),)
+        self.metrics.observe('stage_seconds', elapsed, labels)
+        if exc_type is not None:
+            self.metrics.inc('stage_errors_total', labels=labels)
+        if self.metrics.trace_file is not None:
+            self.metrics.trace(self.name, seconds=round(elapsed, 6), ok=exc_type is None, **self.fields)
+        return False
+
+
+class Metrics:
+    """Histograms, counters and scrape-time gauges for one process.
+
+    `Metrics(enabled=False)` turns every call into a no-op, so instrumented
+    code never needs to check whether metrics are configured.
+    """
+
+    def __init__(self, enabled=True, trace_path=None, buckets=DEFAULT_BUCKETS):
+        self.enabled = enabled
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+        self._gauges = {}
+        self.trace_file = None
+        self._last_flush = 0.0
+        if enabled and trace_path:
+            self.trace_file = open(trace_path, 'a', encoding='utf-8')
+
+    # --- Recording ---
+    def stage(self, name, **fields):
+        """Context manager timing one stage; extra fields only go to the trace."""
+        if not self.enabled:
+            return nullcontext()
+        return _Stage(self, name, fields)
+
+    def observe(self, name, value, labels=()):
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self._histograms.get((name, labels))
+            if histogram is None:
+                histogram = self._histograms[(name, labels)] = Histogram(self.buckets)
+            histogram.observe(value)
+
+    def inc(self, name, amount=1, labels=()):
+        if not self.enabled:
+            return
+        with self._lock:
+            key = (name, labels)
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def gauge(self, name, read, kind='gauge'):
+        """Register `read()` to be called at scrape time. Use kind='counter' for running totals."""
+        if self.enabled:
+            self._gauges[name] = (read, kind)
+
+    def trace(self, event, **fields):
+        if self.trace_file is None:
+            return
+        line = json.dumps({'ts': round(time.time(), 6), 'event': event, **fields}, default=str)
+        with self._lock:
+            self.trace_file.write(line + "\n")
+            # Flushed at most once a second, so tracing never waits on the disk per stage
+            now = time.monotonic()
+            if now - self._last_flush >= 1.0:
+                self.trace_file.flush()
+                self._last_flush = now
+
+    def close(self):
+        if self.trace_file is not None:
+            with self._lock:
+                self.trace_file.close()
+                self.trace_file = None
+
+    def means(self, name='stage_seconds'):
+        """{label value: (count, mean)} for a histogram with a single label, e.g. per stage."""
+        with self._lock:
+            return {labels[0][1]: (h.count, h.sum / h.count)
+                    for (n, labels), h in self._histograms.items() if n == name and labels and h.count}
+
+    # --- Exposition ---
+    def render(self):
+        """The current values in the Prometheus text exposition format."""
+        with self._lock:
+            histograms = {k: (list(h.counts), h.sum, h.count) for k, h in self._histograms.items()}
+            counters = dict(self._counters)
+        gauges = {}
+        for name, (read, kind) in self._gauges.items():
+            try:
+                gauges[name] = (read(), kind)
+            except Exception:
+                continue
+
+        lines = []
+        described = set()
+
+        def describe(name, kind):
+            if name not in described:
+                described.add(name)
+                lines.append(f"# HELP {PREFIX}{name} {HELP.get(name, name)}")
+                lines.append(f"# TYPE {PREFIX}{name} {kind}")
+
+        for (name, labels), (counts, total, count) in sorted(histograms.items()):
+            describe(name, 'histogram')
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f"{PREFIX}{name}_bucket{_label_text(labels + (('le', bound),))} {cumulative}")
+            lines.append(f"{PREFIX}{name}_bucket{_label_text(labels + (('le', '+Inf'),))} {count}")
+            lines.append(f"{PREFIX}{name}_sum{_label_text(labels)} {total}")
+            lines.append(f"{PREFIX}{name}_count{_label_text(labels)} {count}")
+        for (name, labels), value in sorted(counters.items()):
+            describe(name, 'counter')
+            lines.append(f"{PREFIX}{name}{_label_text(labels)} {value}")
+        for name, (value, kind) in sorted(gauges.items()):
+            describe(name, kind)
+            lines.append(f"{PREFIX}{name} {value}")
+        return "\n".join(lines) + "\n"
+
+    def serve(self, host='127.0.0.1', port=9108):
+        """Serve GET /metrics from a daemon thread. Returns the server."""
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                payload = metrics.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, name="metrics-api", daemon=True).start()
+        return server
+
+
+# --- Profiler hooks ---
+# Before Python 3.12 cProfile only sees the thread that enabled it
+PER_THREAD_PROFILES = sys.version_info < (3, 12)
+
+
+class CpuProfiler:
+    """cProfile sessions that also cover background worker threads.
+
+    In outbox and pipelined mode the work happens on worker threads while the
+    main thread sleeps. `start()`/`stop()` (run by the signal handler) profile
+    the main thread and open/close a session; worker loops call `checkpoint()`
+    once per iteration, which profiles that thread while a session is open and
+    writes its `cpu-<time>-<thread>.prof` once the session has closed.
+    """
+
+    def __init__(self):
+        self.profile_dir = None
+        self.session = None
+        self._local = threading.local()
+
+    def start(self, profile_dir):
+        self.profile_dir = profile_dir
+        self.session = time.strftime('%Y%m%d-%H%M%S')
+        return self.checkpoint(main=True)
+
+    def stop(self):
+        self.session = None
+        return self.checkpoint(main=True)
+
+    def checkpoint(self, main=False):
+        """Join or leave the current session. Returns the profile path once one is written."""
+        current = getattr(self._local, 'profile', None)
+        if current is None:
+            # From 3.12 the main thread's profiler already sees every thread
+            if self.session is not None and (main or PER_THREAD_PROFILES):
+                profiler = cProfile.Profile()
+                self._local.profile = (self.session, profiler)
+                profiler.enable()
+            return None
+        session, profiler = current
+        if session is self.session:
+            return None
+        self._local.profile = None
+        profiler.disable()
+        path = os.path.join(self.profile_dir, f"cpu-{session}-{threading.current_thread().name}.prof")
+        profiler.dump_stats(path)
+        return path
+
+
+cpu_profiler = CpuProfiler()
+
+
+def install_profiler_hooks(profile_dir, cpu_signal='SIGUSR1', memory_signal='SIGUSR2', top=25):
+    """Attach profilers on demand, without restarting the process.
+
+    The first `cpu_signal` starts cProfile on the main thread and on every
+    worker loop that calls `cpu_profiler.checkpoint()`; the second writes one
+    `cpu-<time>-<thread>.prof` per thread (workers at their next iteration).
+    Open them with `python -m pstats` or snakeviz, or merge them with
+    `pstats.Stats(*paths)`. The first `memory_signal` starts tracemalloc and
+    every later one writes a `mem-<time>.snapshot` and prints the top
+    allocation sites. Returns False where the signals do not exist (Windows).
+    """
+    if not hasattr(signal, cpu_signal) or not hasattr(signal, memory_signal):
+        return False
+    os.makedirs(profile_dir, exist_ok=True)
+
+    def toggle_cpu(signum, frame):
+        if cpu_profiler.session is None:
+            cpu_profiler.start(profile_dir)
+            print(f"🔬 CPU profiling started; send {cpu_signal} again to write the profiles.")
+            return
+        path = cpu_profiler.stop()
+        print(f"🔬 CPU profile written to {path}; worker threads write theirs next to it.")
+
+    def snapshot_memory(signum, frame):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(10)
+            print(f"🔬 Memory tracing started; send {memory_signal} again for a snapshot.")
+            return
+        snapshot = tracemalloc.take_snapshot()
+        path = os.path.join(profile_dir, f"mem-{time.strftime('%Y%m%d-%H%M%S')}.snapshot")
+        snapshot.dump(path)
+        print(f"🔬 Memory snapshot written to {path}. Top allocation sites:")
+        for stat in snapshot.statistics('lineno')[:top]:
+            print(f"   {stat}")
+
+    signal.signal(getattr(signal, cpu_signal), toggle_cpu)
+    signal.signal(getattr(signal, memory_signal), snapshot_memory)
+    return True
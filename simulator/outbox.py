@@ -0,0 +1,260 @@
+# simulator/outbox.py
+# Durable outbox for temperature readings.
+#
+# Every reading is committed to a local SQLite database (WAL, fsync on commit)
+# before anything touches the network, and a background OutboxSender drains it.
+# The transaction hash is written before each broadcast, so after a crash or a
+# provider outage the sender knows exactly which readings reached the chain
+# and never records one twice. Hashes are written once per signed group and
+# receipts once per tracker poll, so the fsyncs are shared between readings. A backlog is drained many readings at a time
+# (one batched preflight per chunk, a deep in-flight window) instead of one
+# reading per interval.
+import json
+import sqlite3
+import threading
+
+from web3 import Web3
+from web3.exceptions import ContractLogicError
+
+from metrics import cpu_profiler
+from tx_pipeline import NonceManager, ReceiptTracker, find_receipt
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS readings (
+    id           INTEGER PRIMARY KEY AUTOINCREMENT,
+    shipment_id  TEXT    NOT NULL,
+    timestamp    INTEGER NOT NULL,
+    temperature  INTEGER NOT NULL,
+    status       TEXT    NOT NULL DEFAULT 'pending',
+    nonce        INTEGER,
+    tx           TEXT,
+    tx_hashes    TEXT    NOT NULL DEFAULT '[]',
+    block_number INTEGER,
+    error        TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_readings_status ON readings (status, id);
+"""
+
+# pending   -> stored, not signed yet
+# sent      -> signed with `nonce`; every hash signed for it is in tx_hashes
+# confirmed -> mined with status 1 in `block_number`
+# reverted  -> mined with status 0
+# rejected  -> the preflight eth_call reverted, so it was never sent
+BACKLOG_STATUSES = ('pending', 'sent')
+
+
+class Outbox:
+    """One outbox per oracle key: nonces are only tracked for the wallet that drains it."""
+
+    def __init__(self, path):
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        # fsync every commit: a reading acknowledged by append() survives a power cut
+        self.conn.execute("PRAGMA synchronous=FULL")
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+
+    def _rows(self, query, params=()):
+        with self.lock:
+            rows = [dict(r) for r in self.conn.execute(query, params)]
+        for row in rows:
+            if row['tx']:
+                row['tx'] = json.loads(row['tx'])
+                row['tx']['data'] = Web3.to_bytes(hexstr=row['tx']['data'])
+            row['tx_hashes'] = json.loads(row['tx_hashes'])
+        return rows
+
+    def append(self, shipment_id, timestamp, temperature):
+        with self.lock, self.conn:
+            cursor = self.conn.execute(
+                "INSERT INTO readings (shipment_id, timestamp, temperature) VALUES (?, ?, ?)",
+                (shipment_id, timestamp, temperature),
+            )
+        return cursor.lastrowid
+
+    def pending(self, limit):
+        return self._rows("SELECT * FROM readings WHERE status = 'pending' ORDER BY id LIMIT ?", (limit,))
+
+    def in_flight(self):
+        return self._rows("SELECT * FROM readings WHERE status = 'sent' ORDER BY nonce")
+
+    def backlog(self):
+        with self.lock:
+            return self.conn.execute(
+                "SELECT COUNT(*) FROM readings WHERE status IN (?, ?)", BACKLOG_STATUSES).fetchone()[0]
+
+    def counts(self):
+        with self.lock:
+            return dict(self.conn.execute("SELECT status, COUNT(*) FROM readings GROUP BY status").fetchall())
+
+    def mark_signed(self, signed):
+        """Record signatures before they are broadcast, one commit for the whole list.
+
+        `signed` holds (reading_id, nonce, tx, tx_hash). Re-signing the same
+        transaction adds no new hash.
+        """
+        with self.lock, self.conn:
+            for reading_id, nonce, tx, tx_hash in signed:
+                row = self.conn.execute("SELECT tx_hashes FROM readings WHERE id = ?", (reading_id,)).fetchone()
+                hashes = json.loads(row['tx_hashes'])
+                if tx_hash not in hashes:
+                    hashes.append(tx_hash)
+                self.conn.execute(
+                    "UPDATE readings SET status = 'sent', nonce = ?, tx = ?, tx_hashes = ?, error = NULL WHERE id = ?",
+                    (nonce, json.dumps({**tx, 'data': Web3.to_hex(tx['data'])}), json.dumps(hashes), reading_id),
+                )
+
+    def mark_mined(self, mined):
+        """Record receipts, one commit for the whole list of (reading_id, receipt)."""
+        with self.lock, self.conn:
+            self.conn.executemany(
+                "UPDATE readings SET status = ?, block_number = ? WHERE id = ?",
+                [('confirmed' if receipt.status == 1 else 'reverted', receipt.blockNumber, reading_id)
+                 for reading_id, receipt in mined],
+            )
+
+    def requeue(self, reading_id, error):
+        """Send the reading again with a new nonce. Only safe once none of its hashes can be mined."""
+        with self.lock, self.conn:
+            self.conn.execute(
+                "UPDATE readings SET status = 'pending', nonce = NULL, tx = NULL, error = ? WHERE id = ?",
+                (error, reading_id),
+            )
+
+    def reject(self, reading_id, reason):
+        with self.lock, self.conn:
+            self.conn.execute("UPDATE readings SET status = 'rejected', error = ? WHERE id = ?", (reason, reading_id))
+
+
+class OutboxSender:
+    """Drains an Outbox through a Simulator's preflight and a ReceiptTracker on a background thread."""
+
+    def __init__(self, simulator, outbox, outbox_config, on_confirmed=None):
+        self.simulator = simulator
+        self.outbox = outbox
+        self.w3 = simulator.w3
+        self.metrics = simulator.metrics
+        self.batch_size = outbox_config.get('drain_batch_size', 50)
+        self.idle_seconds = outbox_config.get('idle_seconds', 1)
+        self.max_backoff = outbox_config.get('max_backoff_seconds', 60)
+        self.on_confirmed = on_confirmed
+
+        self.nonces = NonceManager(self.w3, simulator.wallet_address)
+        self.tracker = ReceiptTracker(
+            self.w3, simulator.signer, self.nonces,
+            max_in_flight=outbox_config.get('max_in_flight', 16),
+            poll_seconds=outbox_config.get('receipt_poll_seconds', 2),
+            replace_after_seconds=outbox_config.get('replace_after_seconds', 90),
+            gas_bump_percent=outbox_config.get('gas_bump_percent', 12.5),
+            drop_after_seconds=outbox_config.get('drop_after_seconds', 120),
+            on_confirmed=self._confirmed,
+            on_dropped=self._dropped,
+            on_signed=self._signed,
+            on_polled=self._flush_mined,
+            metrics=self.metrics,
+        )
+        # Receipts are written once per tracker poll, not once per reading
+        self._mined = []
+        self._mined_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="outbox-sender", daemon=True)
+
+    # --- Lifecycle ---
+    def start(self):
+        self.tracker.start()
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=30):
+        """Stop taking new readings and give in-flight ones `timeout` seconds to confirm."""
+        self._stop.set()
+        self._thread.join(timeout)
+        self.tracker.stop(drain=True, timeout=timeout)
+        self._flush_mined()
+
+    # --- Tracker callbacks ---
+    def _signed(self, signed):
+        if signed:
+            self.outbox.mark_signed([(pending.label, pending.nonce, pending.tx, tx_hash) for pending, tx_hash in signed])
+
+    def _confirmed(self, pending, receipt):
+        # A receipt lost in a crash is found again by recover(), so it can wait for the end of the poll
+        with self._mined_lock:
+            self._mined.append((pending.label, receipt))
+        if self.on_confirmed:
+            self.on_confirmed(pending, receipt)
+
+    def _flush_mined(self):
+        with self._mined_lock:
+            mined, self._mined = self._mined, []
+        if mined:
+            self.outbox.mark_mined(mined)
+
+    def _dropped(self, pending):
+        print(f"❌ Reading #{pending.label} lost nonce {pending.nonce} to another transaction, requeueing it.")
+        self.outbox.requeue(pending.label, f"nonce {pending.nonce} used by another transaction")
+
+    # --- Draining ---
+    def recover(self):
+        """Settle readings that were signed by an earlier run before sending anything new."""
+        rows = self.outbox.in_flight()
+        if not rows:
+            return
+        mined = []
+        adopted = 0
+        for row in rows:
+            receipt = find_receipt(self.w3, row['tx_hashes'])
+            if receipt is not None:
+                mined.append((row['id'], receipt))
+            else:
+                # Even with its nonce used, the receipt may just be lagging: the tracker only
+                # reports it dropped (and so requeued) after drop_after_seconds without one
+                self.tracker.adopt(row['nonce'], row['tx'], row['tx_hashes'], label=row['id'])
+                adopted += 1
+        self.outbox.mark_mined(mined)
+        print(f"♻️  Outbox recovery: {len(mined)} already mined, {adopted} back in flight.")
+
+    def drain_once(self):
+        """Preflight and submit the next chunk of pending readings. Returns how many were taken."""
+        rows = self.outbox.pending(self.batch_size)
+        if not rows:
+            return 0
+        if len(rows) > 1:
+            print(f"🚚 Draining {len(rows)} buffered readings ({self.outbox.backlog()} in backlog)...")
+
+        prepared = self.simulator.prepare_readings([(r['shipment_id'], r['temperature']) for r in rows])
+        accepted = []
+        for row, tx in zip(rows, prepared):
+            if isinstance(tx, ContractLogicError):
+                # Kept in the outbox with the reason, so the local record has no gaps
+                print(f"❌ Reading #{row['id']} rejected by the preflight check: {tx}")
+                self.outbox.reject(row['id'], str(tx))
+                continue
+            accepted.append((tx, row['id']))
+        # Signed as many at a time as the in-flight window has room for, with one
+        # commit for each group's hashes; blocks while the window is full, which paces the drain
+        self.tracker.submit_many(accepted)
+        return len(rows)
+
+    def _run(self):
+        backoff = 1
+        recovered = False
+        while not self._stop.is_set():
+            cpu_profiler.checkpoint()
+            try:
+                if not recovered:
+                    self.recover()
+                    recovered = True
+                taken = self.drain_once()
+                backoff = 1
+            except Exception as e:
+                # RPC outage: the readings stay in the outbox, retry with exponential backoff
+                print(f"⚠️  Outbox sender error, retrying in {backoff}s ({self.outbox.backlog()} in backlog): {e}")
+                self.metrics.inc('errors_total')
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, self.max_backoff)
+                continue
+            if not taken:
+                self._stop.wait(self.idle_seconds)
@@ -0,0 +1,143 @@
+# simulator/proof_store.py
+# Local store for batched reading windows: every leaf and its Merkle proof,
+# plus the transaction that committed the window's root on-chain. Like the
+# outbox, a window's nonce and every hash signed for it are stored before the
+# broadcast, so a timeout or restart never commits the same window twice.
+import json
+import sqlite3
+import threading
+
+from web3 import Web3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS windows (
+    root          TEXT PRIMARY KEY,
+    shipment_id   TEXT    NOT NULL,
+    reading_count INTEGER NOT NULL,
+    min_temp      INTEGER NOT NULL,
+    max_temp      INTEGER NOT NULL,
+    created_at    INTEGER NOT NULL,
+    tx_hash       TEXT,
+    block_number  INTEGER,
+    nonce         INTEGER,
+    tx            TEXT,
+    tx_hashes     TEXT    NOT NULL DEFAULT '[]'
+);
+CREATE TABLE IF NOT EXISTS readings (
+    root        TEXT    NOT NULL,
+    leaf_index  INTEGER NOT NULL,
+    shipment_id TEXT    NOT NULL,
+    timestamp   INTEGER NOT NULL,
+    temperature INTEGER NOT NULL,
+    proof       TEXT    NOT NULL,
+    PRIMARY KEY (root, leaf_index)
+);
+CREATE INDEX IF NOT EXISTS idx_readings_shipment ON readings (shipment_id, timestamp);
+"""
+
+# Added after the first release; older stores get them on open
+SENT_COLUMNS = (('nonce', 'INTEGER'), ('tx', 'TEXT'), ('tx_hashes', "TEXT NOT NULL DEFAULT '[]'"))
+
+
+class ProofStore:
+    """Windows with their leaves and proofs. `tx_hash` is only set once a window
+    is mined; a signed but unmined one has a `nonce`, its tx and every hash signed for it."""
+
+    def __init__(self, path):
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        columns = {row['name'] for row in self.conn.execute("PRAGMA table_info(windows)")}
+        for name, kind in SENT_COLUMNS:
+            if name not in columns:
+                self.conn.execute(f"ALTER TABLE windows ADD COLUMN {name} {kind}")
+        self.conn.commit()
+
+    def _windows(self, query, params=()):
+        with self.lock:
+            rows = [dict(r) for r in self.conn.execute(query, params)]
+        for row in rows:
+            if row['tx']:
+                row['tx'] = json.loads(row['tx'])
+                row['tx']['data'] = Web3.to_bytes(hexstr=row['tx']['data'])
+            row['tx_hashes'] = json.loads(row['tx_hashes'])
+        return rows
+
+    def save_window(self, shipment_id, tree, readings, created_at):
+        """Store a window before it is submitted. `readings` is a list of (timestamp, temp_scaled)."""
+        root = Web3.to_hex(tree.root)
+        temps = [temp for _, temp in readings]
+        # Same root, same readings: saving it again must not forget how it was sent
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR IGNORE INTO windows (root, shipment_id, reading_count, min_temp, max_temp, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (root, shipment_id, len(readings), min(temps), max(temps), created_at),
+            )
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO readings (root, leaf_index, shipment_id, timestamp, temperature, proof) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(root, i, shipment_id, ts, temp, json.dumps([Web3.to_hex(p) for p in tree.proof(i)]))
+                 for i, (ts, temp) in enumerate(readings)],
+            )
+        return root
+
+    def mark_signed(self, root, nonce, tx, tx_hash):
+        """Record a signature before it is broadcast. Re-signing the same transaction adds no new hash."""
+        stored_tx = json.dumps({**tx, 'data': Web3.to_hex(tx['data'])})
+        with self.lock, self.conn:
+            row = self.conn.execute("SELECT tx_hashes FROM windows WHERE root = ?", (root,)).fetchone()
+            hashes = json.loads(row['tx_hashes'])
+            if tx_hash not in hashes:
+                hashes.append(tx_hash)
+            self.conn.execute(
+                "UPDATE windows SET nonce = ?, tx = ?, tx_hashes = ? WHERE root = ?",
+                (nonce, stored_tx, json.dumps(hashes), root),
+            )
+
+    def mark_committed(self, root, tx_hash, block_number):
+        with self.lock, self.conn:
+            self.conn.execute(
+                "UPDATE windows SET tx_hash = ?, block_number = ? WHERE root = ?",
+                (tx_hash, block_number, root),
+            )
+
+    def requeue(self, root):
+        """Send the window again with a new nonce. Only safe once none of its hashes can be mined."""
+        with self.lock, self.conn:
+            self.conn.execute("UPDATE windows SET nonce = NULL, tx = NULL WHERE root = ?", (root,))
+
+    def unsent(self):
+        """Windows not committed and not signed: they need a new transaction."""
+        return self._windows("SELECT * FROM windows WHERE tx_hash IS NULL AND nonce IS NULL ORDER BY created_at")
+
+    def in_flight(self):
+        """Windows signed with a nonce but not known to be mined."""
+        return self._windows("SELECT * FROM windows WHERE tx_hash IS NULL AND nonce IS NOT NULL ORDER BY nonce")
+
+    def window(self, root):
+        rows = self._windows("SELECT * FROM windows WHERE root = ?", (root,))
+        return rows[0] if rows else None
+
+    def window_readings(self, root):
+        with self.lock:
+            return [dict(r) for r in self.conn.execute(
+                "SELECT * FROM readings WHERE root = ? ORDER BY leaf_index", (root,))]
+
+    def find_reading(self, shipment_id=None, timestamp=None, root=None, index=None):
+        """Look up one reading, either by (root, index) or by shipment and timestamp."""
+        with self.lock:
+            if root is not None and index is not None:
+                row = self.conn.execute(
+                    "SELECT * FROM readings WHERE root = ? AND leaf_index = ?", (root, index)).fetchone()
+            else:
+                row = self.conn.execute(
+                    "SELECT * FROM readings WHERE shipment_id = ? AND timestamp = ? ORDER BY root LIMIT 1",
+                    (shipment_id, timestamp)).fetchone()
+        if row is None:
+            return None
+        reading = dict(row)
+        reading['proof'] = json.loads(reading['proof'])
+        return reading
@@ -0,0 +1,183 @@
+# simulator/rpc.py
+# JSON-RPC helpers for the reading hot path: an HTTP provider that counts what
+# it sends, a batch that ships independent calls in one HTTP request, and a
+# TTL cache for chain metadata (gas price, fee history) that changes slowly.
+import threading
+import time
+
+from web3 import HTTPProvider
+
+
+def quantity(value):
+    """JSON-RPC quantity to int. Nodes send hex strings; in-process test providers send ints."""
+    return value if isinstance(value, int) else int(value, 16)
+
+
+class RpcStats:
+    """Counts HTTP round-trips and JSON-RPC calls, in total and for the current reading."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.calls = 0
+        self.readings = 0
+        self._mark = (0, 0)
+
+    def record(self, requests, calls):
+        with self._lock:
+            self.requests += requests
+            self.calls += calls
+
+    def begin_reading(self):
+        with self._lock:
+            self._mark = (self.requests, self.calls)
+
+    def end_reading(self):
+        """Close the current reading and return (http_requests, rpc_calls) it cost."""
+        with self._lock:
+            self.readings += 1
+            return self.requests - self._mark[0], self.calls - self._mark[1]
+
+    def per_reading(self):
+        with self._lock:
+            if not self.readings:
+                return 0.0
+            return self.requests / self.readings
+
+
+class CountingProviderMixin:
+    """Counts every request a provider sends. Mix in before the provider class."""
+
+    def __init__(self, *args, stats=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = stats or RpcStats()
+
+    def make_request(self, method, params):
+        self.stats.record(1, 1)
+        return super().make_request(method, params)
+
+    def make_batch_request(self, requests):
+        self.stats.record(1, len(requests))
+        return super().make_batch_request(requests)
+
+
+class CountingHTTPProvider(CountingProviderMixin, HTTPProvider):
+    pass
+
+
+class RpcError(Exception):
+    def __init__(self, error):
+        self.code = error.get('code') if isinstance(error, dict) else None
+        message = error.get('message') if isinstance(error, dict) else str(error)
+        super().__init__(message)
+
+
+class BatchCall:
+    __slots__ = ("method", "params", "result", "error")
+
+    def __init__(self, method, params):
+        self.method = method
+        self.params = params
+        self.result = None
+        self.error = None
+
+    def value(self):
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class RpcBatch:
+    """Collect independent JSON-RPC calls and send them as a single batch.
+
+    Results are the raw JSON values (hex strings for quantities). Errors are
+    attached to the individual call rather than failing the whole batch. A
+    transport failure still raises from `execute()`.
+    """
+
+    def __init__(self, provider, enabled=True):
+        self.provider = provider
+        self.enabled = enabled and hasattr(provider, 'make_batch_request')
+        self.calls = []
+
+    def add(self, method, params):
+        call = BatchCall(method, params)
+        self.calls.append(call)
+        return call
+
+    def execute(self):
+        if not self.calls:
+            return []
+        if self.enabled and len(self.calls) > 1:
+            responses = self.provider.make_batch_request([(c.method, c.params) for c in self.calls])
+            if isinstance(responses, dict):
+                # Some providers answer a rejected batch with a single error object
+                raise RpcError(responses.get('error', responses))
+            # web3's providers return batch responses sorted back into request order
+        else:
+            responses = [self.provider.make_request(c.method, c.params) for c in self.calls]
+
+        for call, response in zip(self.calls, responses):
+            if 'error' in response and response['error'] is not None:
+                call.error = RpcError(response['error'])
+            else:
+                call.result = response.get('result')
+        return self.calls
+
+
+class TTLValue:
+    """A single cached value that expires `ttl` seconds after it was stored."""
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self.value = None
+        self.expires_at = 0.0
+
+    def fresh(self):
+        return self.value is not None and time.monotonic() < self.expires_at
+
+    def set(self, value):
+        self.value = value
+        self.expires_at = time.monotonic() + self.ttl
+        return value
+
+
+class FeeCache:
+    """Gas price (legacy) or fee history (EIP-1559) cached with a TTL.
+
+    `add_to(batch)` queues a refresh only when the cached value is stale, and
+    `resolve()` returns the fee fields to merge into a transaction dict.
+    """
+
+    def __init__(self, gas_price_ttl=15, fee_history_ttl=15, eip1559=False, priority_percentile=50):
+        self.eip1559 = eip1559
+        self.priority_percentile = priority_percentile
+        self.gas_price = TTLValue(gas_price_ttl)
+        self.fee_history = TTLValue(fee_history_ttl)
+        self._pending = None
+
+    def add_to(self, batch):
+        self._pending = None
+        if self.eip1559 and not self.fee_history.fresh():
+            self._pending = batch.add('eth_feeHistory', [5, 'latest', [self.priority_percentile]])
+        elif not self.eip1559 and not self.gas_price.fresh():
+            self._pending = batch.add('eth_gasPrice', [])
+
+    def resolve(self):
+        if self._pending is not None:
+            result = self._pending.value()
+            self._pending = None
+            if self.eip1559:
+                self.fee_history.set(result)
+            else:
+                self.gas_price.set(quantity(result))
+
+        if not self.eip1559:
+            return {'gasPrice': self.gas_price.value}
+
+        history = self.fee_history.value
+        # The last baseFeePerGas entry is the base fee of the next block
+        base_fee = quantity(history['baseFeePerGas'][-1])
+        rewards = sorted(quantity(r[0]) for r in history.get('reward') or [] if r)
+        tip = rewards[len(rewards) // 2] if rewards else 10 ** 9
+        return {'maxFeePerGas': 2 * base_fee + tip, 'maxPriorityFeePerGas': tip, 'type': 2}
@@ -0,0 +1,177 @@
+# simulator/sensor.py
+# Temperature sensor model shared by the single-shipment simulator and fleet mode.
+import hashlib
+import math
+import random
+
+import numpy as np
+
+
+def generate_temperature_reading(config):
+    temp = random.normalvariate(config['normal_temp'], config['temp_std_dev'])
+    if random.random() < config['breach_chance']:
+        temp += random.uniform(5, 10)
+    return temp
+
+
+# --- Vectorized fleet model ---
+# Readings for a whole fleet are produced per tick as NumPy arrays. Random draws
+# come from a counter-based hash of (seed, shipment, tick, stream), so every
+# shipment's series is reproducible no matter which other shipments are simulated
+# alongside it or in what order.
+
+# Contract thresholds on the x100 scaled temperature (recordTemperature)
+BREACH_LOW_SCALED = 200
+BREACH_HIGH_SCALED = 800
+
+# Pre-classifier codes
+READING_OK = 0
+READING_BREACH_LOW = 1
+READING_BREACH_HIGH = 2
+READING_DROPOUT = -1
+
+_STREAM_STEP = np.uint64(0xD1B54A32D192ED03)
+_TICK_STEP = np.uint64(0x9E3779B97F4A7C15)
+_PHASE_STREAM = 7
+
+
+def shipment_seed(seed, shipment_id):
+    digest = hashlib.blake2b(f"{seed}:{shipment_id}".encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'little')
+
+
+def _mix64(z):
+    # splitmix64 finalizer; uint64 arithmetic wraps around by design
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return z ^ (z >> np.uint64(31))
+
+
+def _uniform(seeds, tick, stream):
+    """Uniform [0, 1) draws, one per shipment, for a given tick and stream."""
+    with np.errstate(over='ignore'):
+        z = seeds + np.uint64(tick) * _TICK_STEP + np.uint64(stream) * _STREAM_STEP
+        return (_mix64(z) >> np.uint64(11)) * (1.0 / (1 << 53))
+
+
+def classify(temps):
+    """Scale readings the way the simulator does and classify them against the contract thresholds.
+
+    Returns (scaled int64 array, int8 codes). Dropouts (NaN) get READING_DROPOUT
+    and a scaled value of 0.
+    """
+    dropped = np.isnan(temps)
+    scaled = np.trunc(np.where(dropped, 0.0, temps) * 100).astype(np.int64)
+    codes = np.zeros(scaled.shape, dtype=np.int8)
+    codes[scaled < BREACH_LOW_SCALED] = READING_BREACH_LOW
+    codes[scaled > BREACH_HIGH_SCALED] = READING_BREACH_HIGH
+    codes[dropped] = READING_DROPOUT
+    return scaled, codes
+
+
+class FleetSensorModel:
+    """Batched sensor model for many shipments.
+
+    Each tick combines an AR(1) drift around the set point, a diurnal ambient
+    term, door-open excursions that decay back over `recovery_minutes`,
+    measurement noise and sensor dropouts (NaN readings). Per-shipment
+    `normal_temp` and `temp_std_dev` come from each shipment's simulation config.
+    """
+
+    def __init__(self, shipments, model_config, tick_seconds):
+        self.shipment_ids = [shipment_id for shipment_id, _ in shipments]
+        seed = model_config.get('seed', 0)
+        self.seeds = np.array([shipment_seed(seed, sid) for sid in self.shipment_ids], dtype=np.uint64)
+        self.setpoint = np.array([sim['normal_temp'] for _, sim in shipments], dtype=np.float64)
+        self.noise_std = np.array([sim['temp_std_dev'] for _, sim in shipments], dtype=np.float64)
+
+        self.tick_seconds = tick_seconds
+        self.phi = model_config.get('ar_phi', 0.95)
+        self.drift_std = model_config.get('drift_std_dev', 0.15)
+        self.ambient_amplitude = model_config.get('ambient_amplitude', 6.0)
+        self.ambient_coupling = model_config.get('ambient_coupling', 0.03)
+        self.door_chance = model_config.get('door_open_chance', 0.002)
+        self.door_min = model_config.get('door_open_min_rise', 3.0)
+        self.door_max = model_config.get('door_open_max_rise', 8.0)
+        self.decay = math.exp(-tick_seconds / (60.0 * model_config.get('recovery_minutes', 15)))
+        self.dropout_chance = model_config.get('dropout_chance', 0.002)
+        self.recover_chance = model_config.get('dropout_recover_chance', 0.2)
+
+        count = len(self.shipment_ids)
+        # Each shipment sits at its own point of the day (different time zones / departure times)
+        self.phase = _uniform(self.seeds, 0, _PHASE_STREAM)
+        self.drift = np.zeros(count)
+        self.excursion = np.zeros(count)
+        self.offline = np.zeros(count, dtype=bool)
+        self.tick = 0
+        self.latest = np.full(count, np.nan)
+
+    def step(self):
+        """Advance one tick and return the readings in °C (NaN where the sensor dropped out)."""
+        t = self.tick
+        u_noise_r = _uniform(self.seeds, t, 0)
+        u_noise_theta = _uniform(self.seeds, t, 1)
+        u_door = _uniform(self.seeds, t, 2)
+        u_rise = _uniform(self.seeds, t, 3)
+        u_dropout = _uniform(self.seeds, t, 4)
+
+        # Box-Muller: one pair of uniforms gives two independent normals
+        radius = np.sqrt(-2.0 * np.log1p(-u_noise_r))
+        theta = 2.0 * np.pi * u_noise_theta
+        noise = radius * np.cos(theta) * self.noise_std
+        shock = radius * np.sin(theta) * self.drift_std
+
+        self.drift = self.phi * self.drift + shock
+        day_fraction = (t * self.tick_seconds) / 86400.0
+        ambient = self.ambient_amplitude * np.sin(2.0 * np.pi * (day_fraction + self.phase))
+
+        opened = u_door < self.door_chance
+        self.excursion = self.excursion * self.decay + opened * (self.door_min + (self.door_max - self.door_min) * u_rise)
+
+        self.offline = np.where(self.offline, u_dropout >= self.recover_chance, u_dropout < self.dropout_chance)
+
+        temps = self.setpoint + self.drift + self.ambient_coupling * ambient + self.excursion + noise
+        temps[self.offline] = np.nan
+        self.tick = t + 1
+        self.latest = temps
+        return temps
+
+    def generate(self, ticks):
+        """Return a (ticks, shipments) array of readings."""
+        out = np.empty((ticks, len(self.shipment_ids)))
+        for row in range(ticks):
+            out[row] = self.step()
+        return out
+
+    def advance_to(self, elapsed_seconds):
+        """Step until the model has covered `elapsed_seconds` of simulated time."""
+        target = int(elapsed_seconds // self.tick_seconds) + 1
+        while self.tick < target:
+            self.step()
+        return self.latest
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Generate fleet readings offline and report throughput and breach mix.")
+    parser.add_argument("--shipments", type=int, default=10000)
+    parser.add_argument("--ticks", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    base = {'normal_temp': 4.0, 'temp_std_dev': 0.5}
+    fleet = [(f"SHIP-{i:06d}", base) for i in range(args.shipments)]
+    model = FleetSensorModel(fleet, {'seed': args.seed}, tick_seconds=30)
+
+    started = time.perf_counter()
+    readings = model.generate(args.ticks)
+    _, codes = classify(readings)
+    elapsed = time.perf_counter() - started
+
+    total = readings.size
+    print(f"{total} readings in {elapsed:.2f}s ({total / elapsed:,.0f} readings/s)")
+    for label, code in (("ok", READING_OK), ("breach low", READING_BREACH_LOW),
+                        ("breach high", READING_BREACH_HIGH), ("dropout", READING_DROPOUT)):
+        print(f"   {label:<12} {np.count_nonzero(codes == code) / total:.4%}")
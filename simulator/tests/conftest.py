@@ -0,0 +1,6 @@
+# simulator/tests/conftest.py
+# The simulator modules import each other as top-level modules, as when run from simulator/.
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
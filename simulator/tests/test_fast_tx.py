@@ -0,0 +1,48 @@
+# simulator/tests/test_fast_tx.py
+# The lean signing path must produce exactly what web3 and eth-account produce.
+#
+#   python -m pytest simulator/tests
+import pytest
+from eth_account import Account
+from hexbytes import HexBytes
+from web3 import Web3
+
+from fast_tx import LeanSigner, RecordTemperatureTemplate
+
+KEY = "0x4c0883a69102937d6231471b5dbb6204fe5129617082792ae468d01a3f362318"
+TO = "0x5FbDB2315678afecb367f032d93F642f64180aa3"
+RECORD_TEMPERATURE_ABI = [{
+    "type": "function", "name": "recordTemperature", "stateMutability": "nonpayable", "outputs": [],
+    "inputs": [{"name": "shipmentId", "type": "string"}, {"name": "tempScaled100", "type": "int256"}],
+}]
+
+LEGACY = {"to": TO, "value": 0, "gas": 200000, "gasPrice": 1_500_000_000, "nonce": 7, "chainId": 11155111}
+EIP1559 = {"to": TO, "value": 0, "gas": 200000, "maxFeePerGas": 30_000_000_000,
+           "maxPriorityFeePerGas": 1_500_000_000, "nonce": 300, "chainId": 11155111}
+
+
+@pytest.mark.parametrize("shipment_id", ["SH-1", "SHIP-000123", "a shipment id longer than one 32-byte word"])
+@pytest.mark.parametrize("temp_scaled", [0, 405, -1, -2550, 2 ** 255 - 1, -2 ** 255])
+def test_template_matches_encode_abi(shipment_id, temp_scaled):
+    contract = Web3().eth.contract(address=TO, abi=RECORD_TEMPERATURE_ABI)
+    template = RecordTemperatureTemplate(contract, shipment_id)
+    expected = HexBytes(contract.encode_abi("recordTemperature", args=[shipment_id, temp_scaled]))
+    assert template.calldata(temp_scaled) == bytes(expected)
+
+
+@pytest.mark.parametrize("tx", [LEGACY, EIP1559, dict(LEGACY, nonce=0, chainId=1), dict(EIP1559, value=10 ** 18)],
+                         ids=["legacy", "eip1559", "legacy-nonce0-mainnet", "eip1559-value"])
+@pytest.mark.parametrize("data", [b"", bytes(range(100)), "0x" + "ab" * 68], ids=["empty", "bytes", "hexstr"])
+def test_lean_signer_matches_eth_account(tx, data):
+    tx = dict(tx, data=data)
+    expected = Account.from_key(KEY).sign_transaction(tx)
+    signed = LeanSigner(KEY).sign_transaction(tx)
+    assert signed.raw_transaction == bytes(expected.raw_transaction)
+    assert signed.hash == bytes(expected.hash)
+
+
+def test_lean_signer_address_and_bytes_to_match_eth_account():
+    signer = LeanSigner(KEY)
+    assert signer.address == Account.from_key(KEY).address
+    tx = dict(LEGACY, data=b"\x01")
+    assert signer.sign_transaction(dict(tx, to=Web3.to_bytes(hexstr=TO))) == signer.sign_transaction(tx)
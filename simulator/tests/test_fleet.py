@@ -0,0 +1,81 @@
+# simulator/tests/test_fleet.py
+# OracleWallet nonces under concurrent sends, and wallet assignment after preflight.
+#
+#   python -m pytest simulator/tests
+import asyncio
+import time
+from types import SimpleNamespace
+
+import rlp
+from eth_utils import big_endian_to_int, keccak
+from web3.exceptions import ContractLogicError
+
+from fleet import Fleet, OracleWallet
+
+TX = {"to": "0x" + "22" * 20, "data": b"", "value": 0, "chainId": 1, "gas": 100000, "gasPrice": 10}
+
+
+def make_wallet(byte):
+    return OracleWallet("0x" + byte * 32)
+
+
+class FakeAsyncEth:
+    """Every call takes `latency` seconds. The first send of each nonce in `fail_nonces` times out unsent."""
+
+    def __init__(self, latency=0.05, fail_nonces=()):
+        self.latency = latency
+        self.fail_nonces = set(fail_nonces)
+        self.accepted = []
+
+    async def get_transaction_count(self, address, block):
+        await asyncio.sleep(self.latency)
+        return 0
+
+    async def send_raw_transaction(self, raw):
+        await asyncio.sleep(self.latency)
+        nonce = big_endian_to_int(rlp.decode(raw)[0])
+        if nonce in self.fail_nonces:
+            self.fail_nonces.discard(nonce)
+            raise TimeoutError("read timed out")
+        self.accepted.append(nonce)
+        return keccak(raw)
+
+
+def test_one_wallet_sends_concurrently_without_nonce_gaps():
+    eth = FakeAsyncEth(latency=0.05, fail_nonces={3})
+    w3 = SimpleNamespace(eth=eth)
+    wallet = make_wallet("01")
+
+    async def send_all():
+        results = await asyncio.gather(*(wallet.send(w3, dict(TX)) for _ in range(40)), return_exceptions=True)
+        # The failed reading is retried, as send_worker does, and fills the nonce it left behind
+        await wallet.send(w3, dict(TX))
+        return results
+
+    started = time.monotonic()
+    results = asyncio.run(send_all())
+    elapsed = time.monotonic() - started
+    assert sum(isinstance(r, TimeoutError) for r in results) == 1
+    assert sorted(eth.accepted) == list(range(40))
+    # 41 sends of 50ms each would take over 2s if the lock were held for the round-trip
+    assert elapsed < 1
+
+
+def test_shipments_keep_the_wallet_they_were_preflighted_with():
+    wallets = [make_wallet("01"), make_wallet("02")]
+    shipments = [(f"SH-{i}", {'interval_seconds': 1}) for i in range(4)]
+    checked = {}
+
+    def record_temperature(shipment_id, temp_scaled):
+        async def call(params):
+            checked[shipment_id] = params['from']
+            if shipment_id == "SH-0":
+                raise ContractLogicError("execution reverted: unknown shipment")
+        return SimpleNamespace(call=call)
+
+    contract = SimpleNamespace(functions=SimpleNamespace(recordTemperature=record_temperature))
+    fleet = Fleet(SimpleNamespace(eth=None), contract, wallets, shipments, {})
+    asyncio.run(fleet.preflight())
+
+    assert [sid for sid, _ in fleet.shipments] == ["SH-1", "SH-2", "SH-3"]
+    assert [w.address for w in fleet.shipment_wallets] == [checked[sid] for sid, _ in fleet.shipments]
@@ -0,0 +1,107 @@
+# simulator/tests/test_outbox.py
+# OutboxSender restarts against the fake node: every reading lands exactly once.
+#
+#   python -m pytest simulator/tests
+import time
+from types import SimpleNamespace
+
+from web3 import Web3
+
+from metrics import Metrics
+from outbox import Outbox, OutboxSender
+from test_tx_pipeline import ADDRESS, TX, FakeAccount, FakeEth
+from tx_pipeline import raw_of
+
+CONFIG = {'receipt_poll_seconds': 0.01, 'idle_seconds': 0.01, 'drop_after_seconds': 0.05, 'max_in_flight': 2}
+
+
+def make_sender(tmp_path, eth):
+    simulator = SimpleNamespace(
+        w3=SimpleNamespace(eth=eth), metrics=Metrics(enabled=False), wallet_address=ADDRESS, signer=FakeAccount(),
+        prepare_readings=lambda readings: [dict(TX) for _ in readings],
+    )
+    outbox = Outbox(str(tmp_path / "outbox.db"))
+    return OutboxSender(simulator, outbox, CONFIG), outbox
+
+
+def sign_in_earlier_run(outbox, reading_id, nonce):
+    """What a crashed run left behind: the hash stored as 'sent', broadcast or not."""
+    tx = dict(TX, nonce=nonce)
+    signed = FakeAccount().sign_transaction(tx)
+    outbox.mark_signed([(reading_id, nonce, tx, Web3.to_hex(signed.hash))])
+    return raw_of(signed), Web3.to_hex(signed.hash)
+
+
+def drain(sender, outbox, timeout=2):
+    sender.start()
+    deadline = time.monotonic() + timeout
+    while outbox.backlog() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    sender.stop(timeout=timeout)
+    return {row['id']: row for row in outbox._rows("SELECT * FROM readings")}
+
+
+def test_restart_with_a_mined_sent_row_marks_it_confirmed_without_sending(tmp_path):
+    eth = FakeEth()
+    sender, outbox = make_sender(tmp_path, eth)
+    reading = outbox.append("SH-1", 1, 500)
+    raw, tx_hash = sign_in_earlier_run(outbox, reading, 0)
+    eth.send_raw_transaction(raw)
+    sends = eth.sends
+
+    sender.recover()
+    assert sender.tracker.in_flight() == 0
+    rows = drain(sender, outbox)
+    assert rows[reading]['status'] == 'confirmed' and rows[reading]['tx_hashes'] == [tx_hash]
+    assert eth.sends == sends and eth.mined == [tx_hash]
+
+
+def test_restart_with_an_unmined_sent_row_sends_it_at_the_same_nonce(tmp_path):
+    eth = FakeEth()
+    sender, outbox = make_sender(tmp_path, eth)
+    reading = outbox.append("SH-1", 1, 500)
+    _, tx_hash = sign_in_earlier_run(outbox, reading, 0)
+
+    sender.recover()
+    assert sender.tracker.in_flight() == 1
+    rows = drain(sender, outbox)
+    # Re-signing the same transaction gives the same hash, which is stored once
+    assert rows[reading]['status'] == 'confirmed'
+    assert (rows[reading]['nonce'], rows[reading]['tx_hashes']) == (0, [tx_hash])
+    assert eth.mined == [tx_hash]
+
+
+def test_restart_with_a_nonce_taken_by_another_tx_requeues_the_reading(tmp_path):
+    eth = FakeEth()
+    sender, outbox = make_sender(tmp_path, eth)
+    reading = outbox.append("SH-1", 1, 500)
+    _, old_hash = sign_in_earlier_run(outbox, reading, 0)
+    eth.mined.append("0x" + "ee" * 32)  # someone else takes nonce 0
+
+    rows = drain(sender, outbox)
+    assert rows[reading]['status'] == 'confirmed' and rows[reading]['nonce'] == 1
+    assert rows[reading]['tx_hashes'] == [old_hash, eth.mined[1]]
+    assert len(eth.mined) == 2
+
+
+def test_readings_behind_timeouts_land_exactly_once(tmp_path):
+    eth = FakeEth(faults=["timeout", "pool_timeout", "timeout"])
+    sender, outbox = make_sender(tmp_path, eth)
+    readings = [outbox.append("SH-1", i, 500 + i) for i in range(5)]
+
+    rows = drain(sender, outbox)
+    assert [rows[r]['status'] for r in readings] == ['confirmed'] * 5
+    assert sorted(rows[r]['nonce'] for r in readings) == [0, 1, 2, 3, 4]
+    assert len(eth.mined) == 5
+
+
+def test_mark_signed_stores_each_hash_once(tmp_path):
+    outbox = Outbox(str(tmp_path / "outbox.db"))
+    first, second = outbox.append("SH-1", 1, 500), outbox.append("SH-1", 2, 510)
+    tx = dict(TX, nonce=0)
+    outbox.mark_signed([(first, 0, tx, "0xaa"), (second, 1, tx, "0xbb")])
+    outbox.mark_signed([(first, 0, tx, "0xaa"), (first, 0, tx, "0xcc")])
+    rows = {row['id']: row for row in outbox.in_flight()}
+    assert rows[first]['tx_hashes'] == ["0xaa", "0xcc"]
+    assert rows[second]['tx_hashes'] == ["0xbb"]
+    assert rows[first]['tx']['data'] == b""
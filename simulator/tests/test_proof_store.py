@@ -0,0 +1,49 @@
+# simulator/tests/test_proof_store.py
+# A window's send state survives re-saving it and reopening an older store.
+#
+#   python -m pytest simulator/tests
+import sqlite3
+
+from merkle import MerkleTree, leaf_hash, shipment_key
+from proof_store import ProofStore
+
+READINGS = [(1000, 500), (1010, 150), (1020, 510)]
+TX = {"to": "0x" + "11" * 20, "data": b"\x01\x02", "nonce": 7, "gas": 150000, "gasPrice": 10, "chainId": 1}
+
+
+def save(store):
+    tree = MerkleTree([leaf_hash(shipment_key("SH-1"), i, ts, t) for i, (ts, t) in enumerate(READINGS)])
+    return store.save_window("SH-1", tree, READINGS, 1)
+
+
+def test_saving_a_window_again_keeps_its_nonce_and_hashes(tmp_path):
+    store = ProofStore(str(tmp_path / "proofs.db"))
+    root = save(store)
+    assert [w['root'] for w in store.unsent()] == [root]
+
+    store.mark_signed(root, 7, TX, "0xaa")
+    store.mark_signed(root, 7, TX, "0xaa")
+    assert save(store) == root
+    assert store.unsent() == []
+    [window] = store.in_flight()
+    assert (window['nonce'], window['tx_hashes'], window['tx']) == (7, ["0xaa"], TX)
+
+    store.requeue(root)
+    assert [w['root'] for w in store.unsent()] == [root]
+    store.mark_committed(root, "0xaa", 12)
+    assert store.unsent() == [] and store.in_flight() == []
+
+
+def test_a_store_from_before_the_send_columns_is_upgraded(tmp_path):
+    path = str(tmp_path / "proofs.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE windows (root TEXT PRIMARY KEY, shipment_id TEXT NOT NULL, reading_count INTEGER "
+                 "NOT NULL, min_temp INTEGER NOT NULL, max_temp INTEGER NOT NULL, created_at INTEGER NOT NULL, "
+                 "tx_hash TEXT, block_number INTEGER)")
+    conn.execute("INSERT INTO windows VALUES ('0x01', 'SH-1', 3, 150, 510, 1, NULL, NULL)")
+    conn.commit()
+    conn.close()
+
+    store = ProofStore(path)
+    [window] = store.unsent()
+    assert (window['root'], window['nonce'], window['tx_hashes']) == ('0x01', None, [])
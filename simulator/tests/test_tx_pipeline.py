@@ -0,0 +1,206 @@
+# simulator/tests/test_tx_pipeline.py
+# ReceiptTracker against a fake node whose sends can fail after (or before) the tx lands.
+#
+#   python -m pytest simulator/tests
+import time
+from types import SimpleNamespace
+
+from eth_utils import keccak
+from web3 import Web3
+from web3.exceptions import TransactionNotFound
+
+from fast_tx import SignedTx
+from tx_pipeline import NonceManager, ReceiptTracker
+
+ADDRESS = "0x" + "11" * 20
+
+
+class FakeAccount:
+    """Signs by encoding nonce and gas price, so the fake node can read them back."""
+    address = ADDRESS
+
+    def sign_transaction(self, tx):
+        raw = f"{tx['nonce']}:{tx['gasPrice']}".encode()
+        return SignedTx(raw, keccak(raw))
+
+
+class FakeEth:
+    """Mines every accepted tx at once unless a fault says otherwise.
+
+    Faults are consumed one per send: 'timeout' lands the tx and then raises,
+    'pool_timeout' only pools it and raises.
+    """
+
+    gas_price = 1
+
+    def __init__(self, faults=()):
+        self.faults = list(faults)
+        self.mined = []
+        self.pool = {}
+        self.receipts = {}
+        self.sends = 0
+        self.receipt_lag = False
+
+    def get_transaction_count(self, address, block):
+        if block == "latest" or not self.pool:
+            return len(self.mined)
+        return max(len(self.mined), max(self.pool) + 1)
+
+    def mine(self):
+        while len(self.mined) in self.pool:
+            tx_hash = self.pool.pop(len(self.mined))
+            self.receipts[tx_hash] = SimpleNamespace(
+                status=1, blockNumber=len(self.mined) + 1, transactionHash=Web3.to_bytes(hexstr=tx_hash))
+            self.mined.append(tx_hash)
+
+    def send_raw_transaction(self, raw):
+        self.sends += 1
+        fault = self.faults.pop(0) if self.faults else None
+        nonce = int(raw.split(b":")[0])
+        tx_hash = Web3.to_hex(keccak(raw))
+        if nonce < len(self.mined):
+            raise ValueError("nonce too low")
+        if self.pool.get(nonce) == tx_hash:
+            raise ValueError("already known")
+        self.pool[nonce] = tx_hash
+        if fault != "pool_timeout":
+            self.mine()
+        if fault in ("timeout", "pool_timeout"):
+            raise TimeoutError("read timed out")
+        return Web3.to_bytes(hexstr=tx_hash)
+
+    def get_transaction_receipt(self, tx_hash):
+        if self.receipt_lag or tx_hash not in self.receipts:
+            raise TransactionNotFound(tx_hash)
+        return self.receipts[tx_hash]
+
+
+def make_tracker(eth, **kwargs):
+    w3 = SimpleNamespace(eth=eth)
+    confirmed = []
+    dropped = kwargs.pop('dropped', [])
+    tracker = ReceiptTracker(
+        w3, FakeAccount(), NonceManager(w3, ADDRESS), max_in_flight=2, poll_seconds=0.01,
+        on_confirmed=lambda pending, receipt: confirmed.append((pending.label, pending.nonce)),
+        on_dropped=lambda pending: dropped.append(pending.label), **kwargs,
+    )
+    return tracker, confirmed
+
+
+def wait_idle(tracker, timeout=2):
+    deadline = time.monotonic() + timeout
+    while tracker.in_flight() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return tracker.in_flight()
+
+
+TX = {"to": ADDRESS, "data": b"", "value": 0, "chainId": 1, "gas": 100000, "gasPrice": 10}
+
+
+def test_send_that_lands_then_times_out_is_confirmed():
+    eth = FakeEth(faults=["timeout", "timeout", "timeout"])
+    tracker, confirmed = make_tracker(eth)
+    tracker.start()
+    for label in ("a", "b", "c"):
+        tracker.submit(TX, label=label)
+    try:
+        # Three timeouts against a window of two would block submit() forever if slots leaked
+        assert wait_idle(tracker) == 0
+    finally:
+        tracker.stop(drain=False)
+    assert confirmed == [("a", 0), ("b", 1), ("c", 2)]
+    assert len(eth.mined) == 3
+
+
+def test_pooled_send_that_times_out_is_rebroadcast_as_already_known():
+    eth = FakeEth(faults=["pool_timeout"])
+    tracker, confirmed = make_tracker(eth)
+    pending = tracker.submit(TX, label="a")
+    assert pending.sent_at is None and len(pending.hashes) == 1
+
+    tracker.start()
+    time.sleep(0.05)
+    eth.mine()
+    try:
+        assert wait_idle(tracker) == 0
+    finally:
+        tracker.stop(drain=False)
+    assert confirmed == [("a", 0)]
+    assert pending.hashes == [eth.mined[0]]
+
+
+def test_nonce_used_by_another_tx_moves_to_a_fresh_nonce():
+    eth = FakeEth()
+    tracker, confirmed = make_tracker(eth)
+    tracker.nonces.resync()
+    eth.mined.append("0x" + "ee" * 32)  # someone else takes nonce 0
+
+    tracker.start()
+    tracker.submit(TX, label="a")
+    try:
+        assert wait_idle(tracker) == 0
+    finally:
+        tracker.stop(drain=False)
+    assert confirmed == [("a", 1)]
+
+
+def test_nonce_too_low_after_our_own_broadcast_is_not_renumbered():
+    eth = FakeEth(faults=["pool_timeout"])
+    tracker, confirmed = make_tracker(eth)
+    pending = tracker.submit(TX, label="a")
+    eth.mine()
+    # The retry meets the nonce our first broadcast already used
+    tracker._broadcast(pending)
+    assert pending.nonce == 0
+
+    tracker.start()
+    try:
+        assert wait_idle(tracker) == 0
+    finally:
+        tracker.stop(drain=False)
+    assert confirmed == [("a", 0)]
+    assert len(eth.mined) == 1
+
+
+def test_lagging_receipt_is_not_reported_dropped():
+    eth = FakeEth()
+    eth.receipt_lag = True
+    dropped = []
+    tracker, confirmed = make_tracker(eth, dropped=dropped, drop_after_seconds=0.5)
+    tracker.start()
+    tracker.submit(TX, label="a")
+    # Far longer than three polls, still inside the grace period
+    time.sleep(0.2)
+    eth.receipt_lag = False
+    try:
+        assert wait_idle(tracker) == 0
+    finally:
+        tracker.stop(drain=False)
+    assert confirmed == [("a", 0)] and dropped == []
+
+
+def test_failed_resync_after_nonce_too_low_frees_the_slot():
+    eth = FakeEth()
+    dropped = []
+    tracker, confirmed = make_tracker(eth, dropped=dropped, drop_after_seconds=0.05)
+    tracker.nonces.resync()
+    eth.mined.append("0x" + "ee" * 32)  # someone else takes nonce 0
+    count = eth.get_transaction_count
+
+    def flaky_count(address, block):
+        if block == "pending":
+            raise TimeoutError("read timed out")
+        return count(address, block)
+
+    eth.get_transaction_count = flaky_count
+    pending = tracker.submit(TX, label="a")
+    assert pending.nonce == 0 and tracker.in_flight() == 1
+
+    tracker.start()
+    try:
+        assert wait_idle(tracker) == 0
+    finally:
+        tracker.stop(drain=False)
+    assert dropped == ["a"]
+    # Both slots of the window are free again
+    assert tracker._slots.acquire(blocking=False) and tracker._slots.acquire(blocking=False)
@@ -0,0 +1,391 @@
+# simulator/tx_pipeline.py
+# Pipelined transaction submission for the PharmaChain oracle.
+#
+# Nonces are assigned locally so several recordTemperature transactions can be
+# in flight at once. A background ReceiptTracker confirms them, re-broadcasts
+# anything that was dropped or is stuck underpriced (same nonce, bumped gas)
+# and resyncs the local nonce when the node tells us it has drifted.
+import threading
+import time
+
+from web3 import Web3
+from web3.exceptions import TransactionNotFound
+
+from metrics import Metrics, cpu_profiler
+
+
+def _error_text(exc):
+    return str(exc).lower()
+
+
+def is_nonce_too_low(exc):
+    text = _error_text(exc)
+    return "nonce too low" in text or "nonce has already been used" in text
+
+
+def is_already_known(exc):
+    text = _error_text(exc)
+    return "already known" in text or "known transaction" in text
+
+
+def is_underpriced(exc):
+    return "underpriced" in _error_text(exc)
+
+
+def raw_of(signed_tx):
+    # Use .raw if available, otherwise fall back to the web3.py v6/v7 names
+    for attr in ("raw", "raw_transaction", "rawTransaction"):
+        raw = getattr(signed_tx, attr, None)
+        if raw is not None:
+            return raw
+    raise AttributeError("Signed transaction has no raw payload")
+
+
+def find_receipt(w3, hashes):
+    """The receipt of whichever of `hashes` was mined (newest first), or None."""
+    for tx_hash in reversed(hashes):
+        try:
+            return w3.eth.get_transaction_receipt(tx_hash)
+        except TransactionNotFound:
+            continue
+    return None
+
+
+class NonceManager:
+    """Hands out consecutive nonces for one wallet without a round-trip per transaction."""
+
+    def __init__(self, w3, address):
+        self.w3 = w3
+        self.address = address
+        self._lock = threading.Lock()
+        self._next = None
+
+    def next_nonce(self):
+        with self._lock:
+            if self._next is None:
+                self._next = self.w3.eth.get_transaction_count(self.address, "pending")
+            nonce = self._next
+            self._next += 1
+            return nonce
+
+    def resync(self):
+        """Re-read the pending nonce from the node, never moving backwards past
+        a nonce that has already been handed out and is still being tracked."""
+        with self._lock:
+            chain_nonce = self.w3.eth.get_transaction_count(self.address, "pending")
+            self._next = chain_nonce if self._next is None else max(chain_nonce, self._next)
+            return self._next
+
+    def reset(self):
+        with self._lock:
+            self._next = None
+
+    def advance_past(self, nonce):
+        """Make sure `nonce` is never handed out again (it belongs to a transaction being re-tracked)."""
+        with self._lock:
+            if self._next is None:
+                self._next = self.w3.eth.get_transaction_count(self.address, "pending")
+            self._next = max(self._next, nonce + 1)
+
+    def peek(self):
+        """The nonce the next transaction will get, or None before the first one."""
+        with self._lock:
+            return self._next
+
+
+class PendingTx:
+    __slots__ = ("nonce", "tx", "hashes", "submitted_at", "sent_at", "attempts", "label")
+
+    def __init__(self, nonce, tx, label=None):
+        self.nonce = nonce
+        self.tx = tx
+        self.hashes = []
+        self.submitted_at = time.monotonic()
+        self.sent_at = None
+        self.attempts = 0
+        self.label = label
+
+    @property
+    def latest_hash(self):
+        return self.hashes[-1] if self.hashes else None
+
+
+class ReceiptTracker:
+    """Keeps up to `max_in_flight` transactions outstanding and confirms them in the background.
+
+    `submit()` blocks only when the in-flight window is full, so the sensor loop
+    never waits on a block. Callbacks `on_confirmed(pending, receipt)` and
+    `on_dropped(pending)` run on the tracker thread, and `on_polled()` after
+    every poll that confirmed something (e.g. to flush writes buffered by
+    `on_confirmed`). `on_signed(signed)` gets a list of (pending, tx_hash)
+    after every signature and before the broadcast, so a caller can persist
+    the hashes first; `submit_many()` hands it a whole group at once. Signing,
+    sending and the send-to-receipt time are recorded as stages on `metrics`.
+    """
+
+    def __init__(self, w3, account, nonce_manager, max_in_flight=8,
+                 poll_seconds=2.0, replace_after_seconds=90.0, gas_bump_percent=12.5, drop_after_seconds=120.0,
+                 on_confirmed=None, on_dropped=None, on_signed=None, on_polled=None, metrics=None):
+        self.w3 = w3
+        self.account = account
+        self.nonces = nonce_manager
+        self.poll_seconds = poll_seconds
+        self.replace_after_seconds = replace_after_seconds
+        # Load-balanced providers can report a nonce as used before they serve its receipt
+        self.drop_after_seconds = max(drop_after_seconds, poll_seconds * 3)
+        self.gas_bump_percent = gas_bump_percent
+        self.on_confirmed = on_confirmed
+        self.on_dropped = on_dropped
+        self.on_signed = on_signed
+        self.on_polled = on_polled
+        self.metrics = metrics or Metrics(enabled=False)
+        self.mined_upto = None
+
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="receipt-tracker", daemon=True)
+
+    # --- Lifecycle ---
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self, drain=True, timeout=None):
+        """Stop the tracker, optionally waiting for every in-flight transaction first."""
+        if drain:
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while self.in_flight() and (deadline is None or time.monotonic() < deadline):
+                time.sleep(self.poll_seconds)
+        self._stop.set()
+        self._thread.join()
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._pending)
+
+    # --- Submission ---
+    def submit(self, tx, label=None):
+        """Assign a nonce to `tx` (a transaction dict without nonce), sign and broadcast it.
+
+        Returns the PendingTx. Broadcast failures that are not nonce related are
+        left to the tracker to retry, so a flaky RPC call never loses a reading.
+        """
+        return self.submit_many([(tx, label)])[0]
+
+    def submit_many(self, items):
+        """Submit (tx, label) pairs, taking as many at a time as there are free slots.
+
+        Each group is signed and passed to `on_signed` in one call before any of
+        it is broadcast. Blocks while the in-flight window is full. Returns the
+        PendingTx objects in order.
+        """
+        items = list(items)
+        submitted = []
+        while items:
+            self._slots.acquire()
+            taken = 1
+            while taken < len(items) and self._slots.acquire(blocking=False):
+                taken += 1
+            try:
+                # Only the first nonce can need a round-trip, so a failure leaves no gap
+                group = [PendingTx(self.nonces.next_nonce(), dict(tx), label) for tx, label in items[:taken]]
+            except Exception:
+                for _ in range(taken):
+                    self._slots.release()
+                raise
+            items = items[taken:]
+
+            raws = []
+            for pending in group:
+                pending.tx["nonce"] = pending.nonce
+                try:
+                    raws.append(self._sign(pending))
+                except Exception as e:
+                    # _broadcast signs it again and leaves it to _poll if that fails too
+                    print(f"⚠️  Signing nonce {pending.nonce} failed: {e}")
+                    raws.append(None)
+            if self.on_signed:
+                self.on_signed([(p, p.latest_hash) for p, raw in zip(group, raws) if raw is not None])
+            for pending, raw in zip(group, raws):
+                self._broadcast(pending, raw)
+                with self._lock:
+                    self._pending[pending.nonce] = pending
+            submitted.extend(group)
+        return submitted
+
+    def adopt(self, nonce, tx, hashes=(), label=None):
+        """Track a transaction signed by an earlier run (e.g. restored after a restart).
+
+        It keeps its nonce and is re-broadcast on the next poll unless one of
+        `hashes` has been mined by then. If its nonce is already used and no
+        receipt turns up within `drop_after_seconds`, it is reported dropped.
+        """
+        self._slots.acquire()
+        pending = PendingTx(nonce, dict(tx, nonce=nonce), label)
+        pending.hashes = list(hashes)
+        # Any of those may already be on-chain, so "nonce too low" must not move it to a new nonce
+        pending.attempts = len(pending.hashes)
+        self.nonces.advance_past(nonce)
+        with self._lock:
+            self._pending[nonce] = pending
+        return pending
+
+    def _sign(self, pending):
+        """Sign `pending.tx` and record its hash. Returns the raw transaction."""
+        with self.metrics.stage('sign', nonce=pending.nonce):
+            signed = self.account.sign_transaction(pending.tx)
+        tx_hash = Web3.to_hex(signed.hash)
+        # Known before the broadcast: if the node accepts it but the call fails, the receipt can still be found
+        if tx_hash not in pending.hashes:
+            pending.hashes.append(tx_hash)
+        return raw_of(signed)
+
+    def _send(self, pending, raw):
+        pending.attempts += 1
+        with self.metrics.stage('send', nonce=pending.nonce):
+            self.w3.eth.send_raw_transaction(raw)
+        pending.sent_at = time.monotonic()
+        return pending.latest_hash
+
+    def _sign_and_send(self, pending):
+        raw = self._sign(pending)
+        if self.on_signed:
+            self.on_signed([(pending, pending.latest_hash)])
+        return self._send(pending, raw)
+
+    def _broadcast(self, pending, raw=None):
+        """Send `raw` (already signed and reported) or sign and send `pending.tx`, handling node errors."""
+        try:
+            if raw is not None:
+                return self._send(pending, raw)
+            return self._sign_and_send(pending)
+        except Exception as e:
+            if is_already_known(e):
+                pending.sent_at = time.monotonic()
+                return pending.latest_hash
+            if is_underpriced(e):
+                self._bump_gas(pending)
+                return self._retry_once(pending)
+            if is_nonce_too_low(e):
+                if pending.attempts > 1:
+                    # An earlier broadcast of ours may be the one that used the nonce; _poll settles it
+                    pending.sent_at = time.monotonic()
+                    return pending.latest_hash
+                # Someone else used this nonce: move the tx to a fresh one
+                if not self._renumber(pending):
+                    pending.sent_at = None
+                    return None
+                return self._retry_once(pending)
+            print(f"⚠️  Broadcast of nonce {pending.nonce} failed, tracker will retry: {e}")
+            pending.sent_at = None
+            return None
+
+    def _retry_once(self, pending):
+        try:
+            return self._sign_and_send(pending)
+        except Exception as e:
+            print(f"⚠️  Retry of nonce {pending.nonce} failed, tracker will retry: {e}")
+            pending.sent_at = None
+            return None
+
+    def _bump(self, value):
+        return int(value * (100 + self.gas_bump_percent) / 100) + 1
+
+    def _bump_gas(self, pending):
+        if "maxFeePerGas" in pending.tx:
+            # EIP-1559: both fee fields must rise for the node to accept the replacement
+            pending.tx["maxFeePerGas"] = self._bump(pending.tx["maxFeePerGas"])
+            pending.tx["maxPriorityFeePerGas"] = self._bump(pending.tx["maxPriorityFeePerGas"])
+            return
+        bumped = self._bump(pending.tx.get("gasPrice", 0))
+        try:
+            bumped = max(bumped, self.w3.eth.gas_price)
+        except Exception:
+            pass
+        pending.tx["gasPrice"] = bumped
+
+    def _renumber(self, pending):
+        """Move `pending` to a fresh nonce. Returns False if the node could not be asked for one."""
+        with self._lock:
+            self._pending.pop(pending.nonce, None)
+        try:
+            self.nonces.resync()
+            pending.nonce = self.nonces.next_nonce()
+        except Exception as e:
+            # Still tracked under the used nonce, so _poll reports it dropped and the slot is freed
+            print(f"⚠️  Could not move nonce {pending.nonce} to a fresh one, tracker will drop it: {e}")
+            with self._lock:
+                self._pending[pending.nonce] = pending
+            return False
+        pending.tx["nonce"] = pending.nonce
+        with self._lock:
+            self._pending[pending.nonce] = pending
+        return True
+
+    # --- Tracking ---
+    def _finish(self, pending):
+        with self._lock:
+            if self._pending.pop(pending.nonce, None) is None:
+                return
+        self._slots.release()
+
+    def _receipt_for(self, pending):
+        return find_receipt(self.w3, pending.hashes)
+
+    def _run(self):
+        while not self._stop.is_set():
+            cpu_profiler.checkpoint()
+            try:
+                self._poll()
+            except Exception as e:
+                print(f"⚠️  Receipt tracker error, resyncing nonce: {e}")
+                try:
+                    self.nonces.resync()
+                except Exception:
+                    pass
+            self._stop.wait(self.poll_seconds)
+
+    def _poll(self):
+        with self._lock:
+            outstanding = sorted(self._pending.values(), key=lambda p: p.nonce)
+        if not outstanding:
+            return
+
+        # One call tells us which of our nonces have been mined
+        mined_upto = self.mined_upto = self.w3.eth.get_transaction_count(self.account.address, "latest")
+        now = time.monotonic()
+
+        confirmed = 0
+        for pending in outstanding:
+            if pending.nonce < mined_upto:
+                receipt = self._receipt_for(pending)
+                if receipt is not None:
+                    confirmed += 1
+                    self._finish(pending)
+                    if pending.sent_at is not None:
+                        # Same meaning as the sequential 'receipt' stage: from the broadcast to the receipt
+                        self.metrics.observe('stage_seconds', now - pending.sent_at, (('stage', 'receipt'),))
+                    if receipt.status != 1:
+                        self.metrics.inc('reverts_total')
+                    if self.on_confirmed:
+                        self.on_confirmed(pending, receipt)
+                elif pending.hashes and now - (pending.sent_at or pending.submitted_at) > self.drop_after_seconds:
+                    # The nonce was consumed by a transaction we did not send
+                    self._finish(pending)
+                    self.metrics.inc('dropped_total')
+                    if self.on_dropped:
+                        self.on_dropped(pending)
+                continue
+
+            if pending.sent_at is None:
+                self._broadcast(pending)
+            elif now - pending.sent_at > self.replace_after_seconds:
+                print(f"⏳ Nonce {pending.nonce} stuck for {now - pending.sent_at:.0f}s, replacing with higher gas...")
+                self.metrics.inc('replacements_total')
+                self._bump_gas(pending)
+                self._broadcast(pending)
+
+        if confirmed and self.on_polled:
+            self.on_polled()
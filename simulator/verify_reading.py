@@ -0,0 +1,95 @@
+# simulator/verify_reading.py
+# Prove a single batched reading against the Merkle root committed on-chain.
+#
+#   python simulator/verify_reading.py --shipment SHIP-102 --timestamp 1760000000
+#   python simulator/verify_reading.py --root 0xabc... --index 3
+import argparse
+import os
+import sys
+
+from dotenv import load_dotenv
+from web3 import Web3
+from web3.middleware import ExtraDataToPOAMiddleware
+
+from app import load_abi
+from merkle import leaf_hash, shipment_key, verify
+from proof_store import ProofStore
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Verify one reading against its on-chain window root.")
+    parser.add_argument("--store", default=os.path.join(script_dir, "proofs.db"), help="Proof store path")
+    parser.add_argument("--shipment", help="Shipment ID (with --timestamp)")
+    parser.add_argument("--timestamp", type=int, help="Reading timestamp (with --shipment)")
+    parser.add_argument("--root", help="Window Merkle root (with --index)")
+    parser.add_argument("--index", type=int, help="Leaf index inside the window (with --root)")
+    parser.add_argument("--offline", action="store_true", help="Only check the proof locally")
+    args = parser.parse_args()
+
+    if not ((args.root and args.index is not None) or (args.shipment and args.timestamp is not None)):
+        parser.error("give either --root and --index, or --shipment and --timestamp")
+
+    store = ProofStore(args.store)
+    reading = store.find_reading(args.shipment, args.timestamp, args.root, args.index)
+    if reading is None:
+        print("❌ Reading not found in the proof store.")
+        return 1
+
+    root = reading['root']
+    shipment_id = reading['shipment_id']
+    proof = [Web3.to_bytes(hexstr=p) for p in reading['proof']]
+    leaf = leaf_hash(shipment_key(shipment_id), reading['leaf_index'], reading['timestamp'], reading['temperature'])
+    print(f"Reading: {shipment_id} #{reading['leaf_index']} at {reading['timestamp']}: "
+          f"{reading['temperature'] / 100:.2f}°C (Scaled: {reading['temperature']})")
+    print(f"Window root: {root}")
+
+    if not verify(proof, Web3.to_bytes(hexstr=root), leaf):
+        print("❌ Proof does NOT match the window root.")
+        return 1
+    print("✅ Proof matches the window root locally.")
+    if args.offline:
+        return 0
+
+    # --- On-chain checks ---
+    load_dotenv(dotenv_path=os.path.join(script_dir, '..', '.env'))
+    alchemy_url = os.getenv("ALCHEMY_URL")
+    contract_address = os.getenv("CONTRACT_ADDRESS")
+    if not all([alchemy_url, contract_address]):
+        raise Exception("Please set ALCHEMY_URL and CONTRACT_ADDRESS in the root .env file.")
+    contract_abi = load_abi()
+
+    w3 = Web3(Web3.HTTPProvider(alchemy_url))
+    w3.middleware_onion.inject(ExtraDataToPOAMiddleware, layer=0)
+    contract = w3.eth.contract(address=contract_address, abi=contract_abi)
+
+    window = store.window(root)
+    if window['block_number'] is None:
+        print("❌ This window has not been committed on-chain yet.")
+        return 1
+
+    logs = contract.events.TemperatureWindow().get_logs(
+        argument_filters={'key': shipment_key(shipment_id), 'merkleRoot': Web3.to_bytes(hexstr=root)},
+        from_block=window['block_number'],
+        to_block=window['block_number'],
+    )
+    if not logs:
+        print(f"❌ No TemperatureWindow event for this root in block {window['block_number']}.")
+        return 1
+    event = logs[0]['args']
+    print(f"✅ Root committed in block {window['block_number']} (tx {Web3.to_hex(logs[0]['transactionHash'])}): "
+          f"{event['readingCount']} readings, min {event['minTemp']}, max {event['maxTemp']}")
+
+    if not contract.functions.verifyReading(
+        Web3.to_bytes(hexstr=root), proof, shipment_id,
+        reading['leaf_index'], reading['timestamp'], reading['temperature'],
+    ).call():
+        print("❌ PharmaChain.verifyReading rejected the proof.")
+        return 1
+    print("✅ PharmaChain.verifyReading accepted the proof.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,82 @@
+import { expect } from "chai";
+import { readFileSync } from "node:fs";
+import { network } from "hardhat";
+
+const { ethers } = await network.connect();
+
+// Roots and proofs built by simulator/merkle.py (regenerate with `python test/fixtures/merkle_windows.py`)
+const fixture = JSON.parse(readFileSync(new URL("./fixtures/merkle_windows.json", import.meta.url), "utf8"));
+
+type Reading = { index: number; timestamp: number; temperature: number; proof: string[] };
+type Window = { root: string; readings: Reading[] };
+
+const isBreach = (t: number) => t < 200 || t > 800;
+
+function windowArgs(window: Window) {
+  const temps = window.readings.map(r => r.temperature);
+  const breaches = window.readings.filter(r => isBreach(r.temperature));
+  return {
+    minTemp: Math.min(...temps),
+    maxTemp: Math.max(...temps),
+    breachTemps: breaches.map(r => r.temperature),
+    breachTimestamps: breaches.map(r => r.timestamp),
+  };
+}
+
+async function deploy() {
+  const [admin, oracle] = await ethers.getSigners();
+  const c = await ethers.deployContract("PharmaChain", [admin.address]);
+  await c.connect(admin).grantRoleTo(ethers.id("MANUFACTURER_ROLE"), admin.address);
+  await c.connect(admin).grantRoleTo(ethers.id("ORACLE_ROLE"), oracle.address);
+  await c.connect(admin).createShipment(fixture.shipmentId, admin.address);
+  return { c, oracle };
+}
+
+describe("PharmaChain batched temperature windows", function () {
+  it("commits every window built by merkle.py, odd sizes included, and verifies each reading", async function () {
+    const { c, oracle } = await deploy();
+    const key = ethers.id(fixture.shipmentId);
+
+    for (const window of fixture.windows as Window[]) {
+      const { minTemp, maxTemp, breachTemps, breachTimestamps } = windowArgs(window);
+      const tx = c.connect(oracle).recordTemperatureBatch(
+        fixture.shipmentId, window.root, window.readings.length, minTemp, maxTemp, breachTemps, breachTimestamps,
+      );
+      await expect(tx).to.emit(c, "TemperatureWindow")
+        .withArgs(key, window.root, window.readings.length, minTemp, maxTemp);
+      // A window is not a single reading, so it must not show up as one
+      await expect(tx).not.to.emit(c, "TemperatureRecorded");
+
+      for (const r of window.readings) {
+        expect(await c.verifyReading(window.root, r.proof, fixture.shipmentId, r.index, r.timestamp, r.temperature),
+          `window of ${window.readings.length}, reading ${r.index}`).to.equal(true);
+        expect(await c.verifyReading(window.root, r.proof, fixture.shipmentId, r.index, r.timestamp, r.temperature + 1))
+          .to.equal(false);
+      }
+    }
+
+    const breaches = (fixture.windows as Window[]).flatMap(w => w.readings).filter(r => isBreach(r.temperature));
+    const [shipment] = await c.getShipment(fixture.shipmentId);
+    expect(shipment.breachCount).to.equal(BigInt(breaches.length));
+  });
+
+  it("rejects a window whose range breaches but lists no breaches", async function () {
+    const { c, oracle } = await deploy();
+    const window = (fixture.windows as Window[]).find(w => w.readings.some(r => isBreach(r.temperature)))!;
+    const { minTemp, maxTemp } = windowArgs(window);
+    await expect(c.connect(oracle).recordTemperatureBatch(
+      fixture.shipmentId, window.root, window.readings.length, minTemp, maxTemp, [], [],
+    )).to.be.revertedWith("missing breaches");
+  });
+
+  it("rejects a listed breach that is inside the safe range", async function () {
+    const { c, oracle } = await deploy();
+    const window = (fixture.windows as Window[]).find(w => w.readings.some(r => isBreach(r.temperature)))!;
+    const { minTemp, maxTemp, breachTemps, breachTimestamps } = windowArgs(window);
+    const safe = window.readings.find(r => !isBreach(r.temperature))!;
+    await expect(c.connect(oracle).recordTemperatureBatch(
+      fixture.shipmentId, window.root, window.readings.length, minTemp, maxTemp,
+      [...breachTemps, safe.temperature], [...breachTimestamps, safe.timestamp],
+    )).to.be.revertedWith("not a breach");
+  });
+});
@@ -0,0 +1,56 @@
+# test/fixtures/merkle_windows.py
+# Regenerates merkle_windows.json with simulator/merkle.py, so the Hardhat tests
+# check the contract against the roots and proofs the simulator really builds.
+#
+#   python test/fixtures/merkle_windows.py
+import json
+import os
+import sys
+
+here = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(here, '..', '..', 'simulator'))
+
+from web3 import Web3  # noqa: E402
+
+from merkle import MerkleTree, leaf_hash, shipment_key  # noqa: E402
+
+SHIPMENT_ID = "SH-MERKLE-1"
+# Odd sizes exercise the node carried up unchanged; two windows contain breaches
+WINDOWS = [
+    [410],
+    [395, 420],
+    [430, 905, 415],
+    [400, 410, 420, 430, 440],
+    [350, 360, 150, 370, 380, 390, 820],
+    [400 + (i * 7) % 90 for i in range(20)],
+]
+
+
+def main():
+    key = shipment_key(SHIPMENT_ID)
+    windows = []
+    timestamp = 1760000000
+    for temps in WINDOWS:
+        readings = []
+        for temp in temps:
+            readings.append((timestamp, temp))
+            timestamp += 30
+        tree = MerkleTree([leaf_hash(key, i, ts, temp) for i, (ts, temp) in enumerate(readings)])
+        windows.append({
+            'root': Web3.to_hex(tree.root),
+            'readings': [{
+                'index': i,
+                'timestamp': ts,
+                'temperature': temp,
+                'proof': [Web3.to_hex(p) for p in tree.proof(i)],
+            } for i, (ts, temp) in enumerate(readings)],
+        })
+    path = os.path.join(here, 'merkle_windows.json')
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'shipmentId': SHIPMENT_ID, 'windows': windows}, f, indent=2)
+        f.write("\n")
+    print(f"Wrote {len(windows)} windows to {path}")
+
+
+if __name__ == "__main__":
+    main()